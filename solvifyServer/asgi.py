@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'solvifyServer.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Los eventos en directo de las subastas (SSE) se sirven fuera de las vistas
+# de Django para que cada suscripción inactiva cueste solo una corrutina
+from subastas.events import AuctionEventsApplication  # noqa: E402
+
+application = AuctionEventsApplication(django_application)
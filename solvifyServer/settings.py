@@ -102,6 +102,54 @@ DATABASES = {
 # }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Con REDIS_URL definido la caché se comparte entre procesos y nodos; si no,
+# cada proceso usa su propia memoria local.
+
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
+# Segundos que un proceso usa su copia de las categorías si la caché no es
+# compartida (subastas/registry.py)
+CATEGORY_REGISTRY_TTL = 5
+
+# Caché de las lecturas públicas de subastas (subastas/caching.py)
+AUCTION_CACHE_ALIAS = 'default'
+AUCTION_CACHE_TIMEOUT = 300
+AUCTION_FACETS_TIMEOUT = 30
+# Segundos que cada proceso recuerda el estado de una subasta y cuántas subastas
+# recuerda como mucho (subastas/state.py)
+AUCTION_STATE_TTL = 2
+AUCTION_STATE_CACHE_SIZE = 1024
+
+# Eventos en directo de las subastas (subastas/events.py). El backend local solo
+# sirve con un único proceso ASGI; con varios, los eventos se reparten por Redis.
+AUCTION_EVENTS_REDIS_URL = os.getenv("REDIS_URL")
+AUCTION_EVENTS_BACKEND = ('subastas.events.RedisBackend' if AUCTION_EVENTS_REDIS_URL
+                          else 'subastas.events.LocalBackend')
+
+# Secuenciador de pujas (subastas/sequencer.py) para las subastas a las que les
+# quedan menos de AUCTION_BID_SEQUENCER_WINDOW segundos
+AUCTION_BID_SEQUENCER = os.getenv("AUCTION_BID_SEQUENCER", "false").lower() == "true"
+AUCTION_BID_SEQUENCER_WINDOW = 600
+
+# Cuánto supera una puja automática (ProxyBid) a la que tiene que batir
+AUCTION_PROXY_INCREMENT = '1.00'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -148,7 +196,7 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 5,
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': ( 
-        'rest_framework_simplejwt.authentication.JWTAuthentication', 
+        'usuarios.authentication.ClaimsJWTAuthentication', 
     ), 
     }
 
@@ -173,7 +221,19 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7), 
     "ROTATE_REFRESH_TOKENS": True, 
     "BLACKLIST_AFTER_ROTATION": True,  
+    "TOKEN_OBTAIN_SERIALIZER": "usuarios.serializers.ClaimsTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "usuarios.serializers.FilteredTokenRefreshSerializer",
 } 
 
+# Cada cuánto completa cada proceso su copia de la lista negra (usuarios/tokens.py)
+TOKEN_BLACKLIST_SYNC_INTERVAL = 2
+
+# Caché LRU de usuarios para los tokens sin datos válidos (usuarios/authentication.py)
+AUTH_USER_CACHE_ALIAS = 'default'
+AUTH_USER_CACHE_SIZE = 1024
+AUTH_USER_CACHE_TTL = 60
+# Confiar en los datos del token solo si la caché es compartida (None: según su backend)
+AUTH_USER_CACHE_SHARED = None
+
 AUTH_USER_MODEL = 'usuarios.CustomUser'
 
@@ -1,8 +1,25 @@
 from django.contrib import admin
+from django.db import transaction
 from .models import Auction, Category, Bid
+from .registry import category_registry
 
 # Register your models here.
 
+class CategoryAdmin(admin.ModelAdmin):
+    # Las categorías también se editan desde aquí: hay que invalidar el registro
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        transaction.on_commit(category_registry.invalidate)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        transaction.on_commit(category_registry.invalidate)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        transaction.on_commit(category_registry.invalidate)
+
+
 admin.site.register(Auction)
-admin.site.register(Category)
+admin.site.register(Category, CategoryAdmin)
 admin.site.register(Bid)
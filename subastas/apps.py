@@ -1,6 +1,21 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_index(sender, using, **kwargs):
+    # En SQLite, las migraciones que reconstruyen la tabla de subastas borran los
+    # triggers del índice FTS5, así que se comprueban tras cada migrate.
+    from django.db import connections
+    from .search import install_search_index
+
+    connection = connections[using]
+    if connection.vendor == "sqlite":
+        install_search_index(connection)
 
 
 class SubastasConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "subastas"
+
+    def ready(self):
+        post_migrate.connect(ensure_search_index, sender=self)
@@ -0,0 +1,151 @@
+import hashlib
+import uuid
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from .models import Auction
+from .state import forget_auction_state
+
+# Caché de las lecturas públicas de subastas. Cada subasta tiene un sello de
+# versión en la caché que se renueva cuando una puja, valoración, comentario o
+# edición la modifica; las respuestas guardadas recuerdan los sellos de las
+# subastas que contienen y se descartan en cuanto alguno cambia. Los listados
+# dependen además de un sello global que cambia al crear, editar o borrar
+# subastas, porque eso puede alterar qué subastas aparecen en cada filtro.
+
+LISTING_VERSION_KEY = "subastas:auctions:version"
+
+
+def get_cache():
+    return caches[getattr(settings, "AUCTION_CACHE_ALIAS", "default")]
+
+def auction_version_key(auction_id):
+    return f"subastas:auction:{auction_id}:version"
+
+
+def renew_versions(keys):
+    get_cache().set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+
+def touch_auctions(auction_ids, listing=False):
+    """
+    Invalida las respuestas en caché que incluyen las subastas (y los listados
+    si `listing`) y su estado en la caché del proceso (subastas/state.py). Se
+    aplica al confirmar la transacción en curso.
+    """
+    keys = [auction_version_key(auction_id) for auction_id in auction_ids]
+    if listing:
+        keys.append(LISTING_VERSION_KEY)
+
+    def invalidate():
+        renew_versions(keys)
+        for auction_id in auction_ids:
+            forget_auction_state(auction_id)
+    transaction.on_commit(invalidate)
+
+def touch_auction(auction_id, listing=False):
+    touch_auctions([auction_id] if auction_id is not None else [], listing=listing)
+
+def touch_listing():
+    touch_auctions([], listing=True)
+
+
+def get_versions(keys):
+    """Devuelve los sellos de `keys`, creando los que falten."""
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+    if missing:
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def request_cache_key(prefix, request):
+    """Clave de caché para la URL de la petición con los parámetros ordenados."""
+    query = sorted((name, value) for name, values in request.query_params.lists() for value in values)
+    url = request.build_absolute_uri(request.path) + "?" + repr(query)
+    return f"subastas:{prefix}:" + hashlib.sha256(url.encode()).hexdigest()
+
+
+class CachedAuctionReadMixin:
+    """
+    Cachea las respuestas GET anónimas de la vista, con clave en la URL
+    normalizada (parámetros ordenados), y añade ETag fuerte con soporte de
+    If-None-Match (304). Las vistas de detalle indican `cache_listing = False`.
+    """
+    cache_listing = True
+    # Sellos de las subastas de la página, leídos en paginate_queryset
+    page_versions = None
+
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().get(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = self.get_response_cache_key(request)
+        entry = cache.get(key)
+        if entry is not None and get_versions(list(entry["versions"])) != entry["versions"]:
+            entry = None
+
+        if entry is None:
+            # Los sellos se leen antes que los datos de la respuesta, así una
+            # escritura concurrente nunca deja datos viejos con sello nuevo
+            self.page_versions = {}
+            before = get_versions(self.get_version_keys(kwargs))
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            ids = self.get_auction_ids(response.data)
+            versions = {**self.page_versions, **before}
+            etag = '"%s"' % hashlib.sha256(JSONRenderer().render(response.data)).hexdigest()[:40]
+            entry = {"data": response.data, "etag": etag, "versions": versions}
+            cache.set(key, entry, timeout=self.get_cache_timeout(ids))
+
+        headers = {"ETag": entry["etag"]}
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match:
+            etags = [tag.removeprefix("W/") for tag in parse_etags(if_none_match)]
+            if "*" in etags or entry["etag"] in etags:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(entry["data"], headers=headers)
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is None or self.page_versions is None:
+            return page
+        # Hasta tener la página no se sabe qué subastas contiene: se leen sus
+        # sellos y después se vuelven a leer sus filas
+        ids = [row["id"] if isinstance(row, dict) else row.pk for row in page]
+        self.page_versions = get_versions([auction_version_key(auction_id) for auction_id in ids])
+        rows = {row["id"] if isinstance(row, dict) else row.pk: row for row in queryset.filter(pk__in=ids)}
+        return [rows[auction_id] for auction_id in ids if auction_id in rows]
+
+    def get_response_cache_key(self, request):
+        return request_cache_key("response", request)
+
+    def get_version_keys(self, kwargs):
+        if self.cache_listing:
+            return [LISTING_VERSION_KEY]
+        return [auction_version_key(kwargs[self.lookup_url_kwarg or self.lookup_field])]
+
+    def get_auction_ids(self, data):
+        if not self.cache_listing:
+            return [data["id"]]
+        rows = data["results"] if isinstance(data, dict) else data
+        return [row["id"] for row in rows]
+
+    def get_cache_timeout(self, ids):
+        # isOpen depende de la hora: la entrada no puede sobrevivir al próximo cierre
+        timeout = getattr(settings, "AUCTION_CACHE_TIMEOUT", 300)
+        next_closing = Auction.objects.filter(id__in=ids, closing_date__gt=timezone.now()) \
+            .aggregate(next_closing=Min("closing_date"))["next_closing"]
+        if next_closing is not None:
+            timeout = min(timeout, int((next_closing - timezone.now()).total_seconds()) + 1)
+        return timeout
@@ -0,0 +1,273 @@
+import asyncio
+import json
+import logging
+import threading
+from datetime import datetime
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+# Eventos en directo de las subastas (Server-Sent Events). Los clientes se
+# suscriben a una o varias subastas en EVENTS_PATH y reciben:
+#   bid     -> nueva puja aceptada
+#   price   -> cambia la puja más alta o el número de pujas
+#   updated -> se ha editado la subasta (p.ej. su fecha de cierre)
+#   closed  -> la subasta ha cerrado (con ganador y precio final si lo emite
+#              el programador de cierres)
+# Cada proceso tiene un broker en memoria que reparte los mensajes entre sus
+# suscriptores; el backend decide cómo llegan los mensajes de otros procesos.
+
+EVENTS_PATH = "/api/subastas/eventos/"
+HEARTBEAT_SECONDS = 15
+MAX_AUCTIONS_PER_SUBSCRIPTION = 50
+QUEUE_SIZE = 100
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBackend:
+    """Solo entrega los eventos dentro del propio proceso (un único worker)."""
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publish(self, message):
+        self.broker.dispatch_threadsafe(message)
+
+    def start(self):
+        pass
+
+
+class RedisBackend:
+    """
+    Reparte los eventos entre procesos y nodos con Redis pub/sub. Cada proceso
+    con suscriptores escucha el canal y entrega los mensajes a los suyos.
+    """
+    channel = "subastas:events"
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.url = getattr(settings, "AUCTION_EVENTS_REDIS_URL", None)
+        self._client = None
+        self._listener = None
+
+    def publish(self, message):
+        import redis
+
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url)
+        try:
+            self._client.publish(self.channel, message)
+        except redis.RedisError:
+            # La próxima publicación abre una conexión nueva
+            self._client = None
+            raise
+
+    def start(self):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self.listen())
+
+    async def listen(self):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        async with client.pubsub() as pubsub:
+            await pubsub.subscribe(self.channel)
+            async for item in pubsub.listen():
+                if item["type"] == "message":
+                    self.broker.dispatch(item["data"].decode())
+
+
+class Subscription:
+    def __init__(self, auction_ids):
+        self.auction_ids = auction_ids
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+        self.closed = set()
+
+    def put(self, message):
+        # "closed" llega del temporizador del broker y del programador de
+        # cierres (close_auctions); cada cliente lo recibe una sola vez
+        if message["event"] == "closed":
+            if message["auction"] in self.closed:
+                return
+            self.closed.add(message["auction"])
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Cliente demasiado lento: se le desconecta y tendrá que reconectar
+            self.overflowed = True
+
+
+class Broker:
+    """
+    Reparte los eventos entre las suscripciones del proceso. Todo el estado se
+    toca desde el bucle de eventos; desde otros hilos se entra con
+    dispatch_threadsafe. Además programa un temporizador por subasta con
+    suscriptores para avisar del cierre.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+        self._timers = {}
+        self._backend = None
+
+    @property
+    def backend(self):
+        with self._lock:
+            if self._backend is None:
+                backend_class = import_string(getattr(settings, "AUCTION_EVENTS_BACKEND", "subastas.events.LocalBackend"))
+                self._backend = backend_class(self)
+        return self._backend
+
+    def publish(self, auction_id, event, data):
+        """
+        Los eventos son un aviso: si el backend falla se registra y se pierde
+        el evento, pero la escritura que lo ha generado ya está confirmada.
+        """
+        message = json.dumps({"auction": auction_id, "event": event, "data": data}, cls=DjangoJSONEncoder)
+        try:
+            self.backend.publish(message)
+        except Exception:
+            logger.exception("Could not publish %s event for auction %s", event, auction_id)
+
+    def publish_on_commit(self, auction_id, event, data):
+        transaction.on_commit(lambda: self.publish(auction_id, event, data), robust=True)
+
+    def dispatch_threadsafe(self, message):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self.dispatch, message)
+
+    def dispatch(self, message):
+        payload = json.loads(message)
+        auction_id = payload["auction"]
+        if payload["event"] == "updated" and auction_id in self._subscriptions:
+            self._schedule_closing(auction_id, payload["data"]["closing_date"])
+        for subscription in list(self._subscriptions.get(auction_id, ())):
+            subscription.put(payload)
+
+    def subscribe(self, closing_dates):
+        self._loop = asyncio.get_running_loop()
+        self.backend.start()
+        subscription = Subscription(list(closing_dates))
+        for auction_id, closing_date in closing_dates.items():
+            subscribers = self._subscriptions.setdefault(auction_id, set())
+            if not subscribers:
+                self._schedule_closing(auction_id, closing_date)
+            subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        for auction_id in subscription.auction_ids:
+            subscribers = self._subscriptions.get(auction_id, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self._subscriptions.pop(auction_id, None)
+                timer = self._timers.pop(auction_id, None)
+                if timer is not None:
+                    timer.cancel()
+
+    def _schedule_closing(self, auction_id, closing_date):
+        if isinstance(closing_date, str):
+            closing_date = datetime.fromisoformat(closing_date)
+        timer = self._timers.pop(auction_id, None)
+        if timer is not None:
+            timer.cancel()
+        delay = (closing_date - timezone.now()).total_seconds()
+        if delay > 0:
+            self._timers[auction_id] = self._loop.call_later(delay, self._closed, auction_id)
+
+    def _closed(self, auction_id):
+        self._timers.pop(auction_id, None)
+        self.dispatch(json.dumps({"auction": auction_id, "event": "closed", "data": {}}))
+
+
+broker = Broker()
+
+
+class AuctionEventsApplication:
+    """
+    Aplicación ASGI que atiende EVENTS_PATH (?subastas=1,2,3) con un flujo SSE
+    y deja pasar el resto de peticiones a Django.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == EVENTS_PATH:
+            await self.stream(scope, receive, send)
+        else:
+            await self.application(scope, receive, send)
+
+    async def stream(self, scope, receive, send):
+        query = parse_qs(scope.get("query_string", b"").decode())
+        try:
+            auction_ids = sorted({int(value) for value in query.get("subastas", [""])[0].split(",") if value})
+        except ValueError:
+            auction_ids = []
+        if not 0 < len(auction_ids) <= MAX_AUCTIONS_PER_SUBSCRIPTION:
+            return await self.respond(send, 400, {
+                "subastas": f"Subastas must be a list of 1 to {MAX_AUCTIONS_PER_SUBSCRIPTION} auction ids."
+            })
+        closing_dates = await sync_to_async(self.get_closing_dates)(auction_ids)
+        if len(closing_dates) != len(auction_ids):
+            return await self.respond(send, 404, {"detail": "Some of the auctions do not exist."})
+
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            (b"access-control-allow-origin", b"*"),
+            (b"x-accel-buffering", b"no"),
+        ]})
+        subscription = broker.subscribe(closing_dates)
+        disconnected = asyncio.ensure_future(self.wait_disconnect(receive))
+        try:
+            for auction_id, closing_date in closing_dates.items():
+                if closing_date <= timezone.now():
+                    subscription.put({"auction": auction_id, "event": "closed", "data": {}})
+            while not disconnected.done() and not subscription.overflowed:
+                getter = asyncio.ensure_future(subscription.queue.get())
+                done, _ = await asyncio.wait({getter, disconnected}, timeout=HEARTBEAT_SECONDS,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    await send({"type": "http.response.body", "body": self.format(getter.result()), "more_body": True})
+                else:
+                    getter.cancel()
+                    if not disconnected.done():
+                        await send({"type": "http.response.body", "body": b": ping\n\n", "more_body": True})
+        finally:
+            broker.unsubscribe(subscription)
+            disconnected.cancel()
+        if not disconnected.done():
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    @staticmethod
+    def get_closing_dates(auction_ids):
+        from .models import Auction
+
+        return dict(Auction.objects.filter(pk__in=auction_ids).values_list("id", "closing_date"))
+
+    @staticmethod
+    async def wait_disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    @staticmethod
+    def format(payload):
+        data = json.dumps({"auction": payload["auction"], **payload["data"]}, cls=DjangoJSONEncoder)
+        return f"event: {payload['event']}\ndata: {data}\n\n".encode()
+
+    @staticmethod
+    async def respond(send, status, body):
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": json.dumps(body).encode()})
@@ -0,0 +1,57 @@
+from decimal import Decimal
+from datetime import datetime, timezone as dt_timezone
+import numpy as np
+from django.utils import timezone
+from .models import Bid
+
+# Histórico de precios de una subasta para las gráficas: las pujas se agrupan
+# en tramos de tiempo de `interval` segundos y de cada tramo se devuelve
+# apertura, máximo, mínimo, cierre y número de pujas (OHLC). La agregación se
+# hace con NumPy sobre dos columnas, sin crear un objeto Bid por puja.
+
+MAX_BUCKETS = 500
+DEFAULT_BUCKETS = 100
+
+
+def price_history(auction_id, interval=None):
+    """
+    Devuelve {"interval": segundos, "buckets": [...]} con las pujas de la
+    subasta. Sin `interval` se elige uno que dé unos DEFAULT_BUCKETS tramos; si
+    el pedido daría más de MAX_BUCKETS, se ensancha.
+    """
+    rows = list(Bid.objects.filter(auction=auction_id).order_by("creation_date", "id")
+                .values_list("creation_date", "price"))
+    if not rows:
+        return {"interval": interval, "buckets": []}
+
+    times = np.fromiter((created.timestamp() for created, _ in rows), dtype=np.float64, count=len(rows))
+    # En céntimos para no perder precisión con los decimales
+    cents = np.fromiter((int(price * 100) for _, price in rows), dtype=np.int64, count=len(rows))
+
+    span = times[-1] - times[0]
+    if interval is None:
+        interval = max(int(np.ceil(span / DEFAULT_BUCKETS)), 1)
+    # Los tramos se alinean a múltiplos de interval, así que puede sobrar uno
+    interval = max(interval, int(span // (MAX_BUCKETS - 1)) + 1)
+
+    origin = times[0] - times[0] % interval
+    buckets = ((times - origin) // interval).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(cents)] - 1
+
+    series = zip(buckets[starts].tolist(), cents[starts].tolist(), np.maximum.reduceat(cents, starts).tolist(),
+                 np.minimum.reduceat(cents, starts).tolist(), cents[ends].tolist(), (ends - starts + 1).tolist())
+    return {"interval": interval, "buckets": [
+        {
+            # Mismo formato que los campos de fecha de los serializadores (hora local)
+            "start": timezone.localtime(datetime.fromtimestamp(origin + bucket * interval, tz=dt_timezone.utc))
+            .strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "open": to_price(open_), "high": to_price(high), "low": to_price(low), "close": to_price(close),
+            "bids": count,
+        }
+        for bucket, open_, high, low, close, count in series
+    ]}
+
+
+def to_price(cents):
+    return str(Decimal(cents).scaleb(-2))
@@ -0,0 +1,107 @@
+import codecs
+import csv
+import json
+from itertools import islice
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from .models import Auction, Rating
+from .serializers import AuctionImportSerializer
+from .caching import touch_listing
+
+# Importación masiva del catálogo de un vendedor desde CSV o NDJSON. El fichero
+# se lee fila a fila y se procesa por trozos: cada trozo se valida con las
+# reglas del serializador de subastas y se guarda con dos bulk_create (las
+# subastas y su valoración inicial), así que la memoria no depende del tamaño
+# del fichero. Cada trozo va en su propia transacción.
+
+FORMATS = ("csv", "ndjson")
+CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+
+def read_rows(stream, fmt):
+    """Genera (número de fila, dict o None si la fila no se puede leer) desde un flujo binario."""
+    # Los bytes que no son UTF-8 no cortan la importación: se conservan como
+    # sustitutos y la fila que los contiene se rechaza como ilegible
+    lines = codecs.iterdecode(stream, "utf-8-sig", errors="surrogateescape")
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(lines), start=1):
+            yield number, row if all(is_utf8(value) for value in row.values() if isinstance(value, str)) else None
+        return
+    number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            row = json.loads(line) if is_utf8(line) else None
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def is_utf8(text):
+    try:
+        text.encode("utf-8")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+class AuctionImport:
+    """Importa las filas de `read_rows` como subastas de `auctioneer` y lleva el informe."""
+
+    def __init__(self, auctioneer, chunk_size=CHUNK_SIZE, on_error=None):
+        self.auctioneer = auctioneer
+        self.chunk_size = chunk_size
+        self.on_error = on_error
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        # Un único serializador para todas las filas, como hace ListSerializer:
+        # construir los campos de un ModelSerializer por fila es lo más caro
+        self.serializer = AuctionImportSerializer()
+
+    def run(self, rows):
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk)
+        if self.created:
+            touch_listing()
+        return self.report()
+
+    def import_chunk(self, chunk):
+        auctions = []
+        for number, row in chunk:
+            if row is None:
+                self.error(number, {"non_field_errors": ["The row could not be parsed."]})
+                continue
+            try:
+                data = self.serializer.run_validation(row)
+            except ValidationError as exc:
+                self.error(number, exc.detail)
+                continue
+            data["category_id"] = data.pop("category")
+            # La valoración inicial del subastador, como en AuctionListCreateSerializer.create
+            auctions.append(Auction(**data, auctioneer=self.auctioneer, rating_sum=1, rating_count=1, rating_1=1))
+        if not auctions:
+            return
+        with transaction.atomic():
+            Auction.objects.bulk_create(auctions)
+            Rating.objects.bulk_create(Rating(auction=auction, reviewer=self.auctioneer, rating=1)
+                                       for auction in auctions)
+        self.created += len(auctions)
+
+    def error(self, number, errors):
+        self.failed += 1
+        if self.on_error is not None:
+            self.on_error(number, errors)
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": number, "errors": errors})
+
+    def report(self):
+        return {"created": self.created, "failed": self.failed, "errors": self.errors,
+                "errors_truncated": self.failed > len(self.errors)}
@@ -0,0 +1,108 @@
+import random
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection
+from django.db.models import Count, Max
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from subastas.models import Auction, Bid, Category
+from subastas.sequencer import bid_sequencer
+from subastas.services import place_bid
+from usuarios.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ("Lanza pujas concurrentes desde varios hilos contra una única subasta y muestra "
+            "las pujas aceptadas por segundo y la tasa de rechazo.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8, help="Hilos pujando a la vez.")
+        parser.add_argument("--bids", type=int, default=200, help="Pujas que lanza cada hilo.")
+        parser.add_argument("--auction", type=int,
+                            help="Subasta sobre la que pujar (por defecto se crea una temporal).")
+        parser.add_argument("--sequencer", action="store_true",
+                            help="Pujar a través del secuenciador de pujas en lugar de place_bid.")
+
+    def handle(self, *args, **options):
+        auction, temporary = self.get_auction(options["auction"])
+        start_count = auction.bid_count
+        accepted, rejected, errors = [0], [0], [0]
+        lock = threading.Lock()
+        submit = place_bid
+        if options["sequencer"]:
+            submit = bid_sequencer.submit
+
+        def worker(index):
+            rng = random.Random(index)
+            ok = ko = failed = 0
+            try:
+                for _ in range(options["bids"]):
+                    # Como haría un cliente: lee la puja más alta y puja algo por encima
+                    current = Auction.objects.filter(pk=auction.pk).values_list("current_bid", flat=True)[0]
+                    price = (current or Decimal("0.00")) + Decimal(rng.randint(1, 100)) / 100
+                    try:
+                        submit(auction.pk, price, f"benchmark{index}")
+                        ok += 1
+                    except ValidationError:
+                        ko += 1
+                    except OperationalError:
+                        # p.ej. "database is locked" en SQLite
+                        failed += 1
+            finally:
+                close_old_connections()
+                connection.close()
+            with lock:
+                accepted[0] += ok
+                rejected[0] += ko
+                errors[0] += failed
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options["threads"])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        attempts = accepted[0] + rejected[0] + errors[0]
+        self.stdout.write(f"Threads: {options['threads']}  attempts: {attempts}  time: {elapsed:.2f}s")
+        self.stdout.write(f"Accepted: {accepted[0]} ({accepted[0] / elapsed:.1f} bids/s)")
+        self.stdout.write(f"Rejected: {rejected[0]} ({100 * rejected[0] / max(attempts, 1):.1f}%)")
+        if errors[0]:
+            self.stdout.write(self.style.WARNING(f"Database errors: {errors[0]}"))
+
+        self.check_consistency(auction, start_count + accepted[0])
+        if temporary:
+            auction.delete()
+
+    def get_auction(self, auction_id):
+        if auction_id is not None:
+            return Auction.objects.get(pk=auction_id), False
+        user = CustomUser.objects.order_by("id").first()
+        category = Category.objects.order_by("id").first()
+        if user is None or category is None:
+            raise SystemExit("The database needs at least one user and one category.")
+        auction = Auction.objects.create(
+            title="Benchmark", description="Subasta temporal de benchmark_bids",
+            closing_date=timezone.now() + timedelta(days=1), thumbnail="https://example.com/benchmark.png",
+            price=Decimal("1.00"), stock=1, category=category, brand="benchmark", auctioneer=user,
+        )
+        return auction, True
+
+    def check_consistency(self, auction, expected_count):
+        auction.refresh_from_db()
+        state = Bid.objects.filter(auction=auction).aggregate(count=Count("id"), highest=Max("price"))
+        prices = list(Bid.objects.filter(auction=auction).order_by("id").values_list("price", flat=True))
+        increasing = all(a < b for a, b in zip(prices, prices[1:]))
+        if (state["count"] == auction.bid_count == expected_count
+                and state["highest"] == auction.current_bid and increasing):
+            self.stdout.write(self.style.SUCCESS("Consistent: every accepted bid beat the previous one."))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f"Inconsistent state: {state['count']} bids, bid_count={auction.bid_count}, "
+                f"expected {expected_count}, highest={state['highest']}, current_bid={auction.current_bid}, "
+                f"strictly increasing={increasing}"
+            ))
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+from subastas.services import close_due_auctions, next_closing_date
+
+
+class Command(BaseCommand):
+    help = ("Programador de cierres: espera al próximo closing_date, marca como cerradas las "
+            "subastas vencidas y guarda su resultado (puja ganadora, ganador y precio final).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true",
+                            help="Cierra las subastas vencidas y termina.")
+        parser.add_argument("--max-sleep", type=float, default=60,
+                            help="Segundos máximos de espera, para ver subastas nuevas o editadas.")
+
+    def handle(self, *args, **options):
+        while True:
+            closed = close_due_auctions()
+            if closed:
+                self.stdout.write(f"Closed {closed} auctions.")
+            if options["once"]:
+                return
+            next_closing = next_closing_date()
+            delay = options["max_sleep"]
+            if next_closing is not None:
+                delay = min(delay, max((next_closing - timezone.now()).total_seconds(), 0.5))
+            close_old_connections()
+            time.sleep(delay)
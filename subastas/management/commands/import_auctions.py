@@ -0,0 +1,35 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from subastas.importer import CHUNK_SIZE, FORMATS, AuctionImport, read_rows
+from usuarios.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ("Importa subastas desde un fichero CSV o NDJSON como catálogo de un vendedor. "
+            "Las filas rechazadas se escriben en la salida de errores.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Fichero a importar.")
+        parser.add_argument("--auctioneer", required=True, help="Nombre del usuario vendedor.")
+        parser.add_argument("--formato", choices=FORMATS,
+                            help="Formato del fichero (por defecto, según la extensión).")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Filas por lote.")
+
+    def handle(self, *args, **options):
+        try:
+            auctioneer = CustomUser.objects.get(username=options["auctioneer"])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"User {options['auctioneer']} does not exist.")
+        fmt = options["formato"] or options["path"].rsplit(".", 1)[-1].lower()
+        if fmt not in FORMATS:
+            raise CommandError(f"Unknown format {fmt}; use --formato.")
+
+        def on_error(number, errors):
+            self.stderr.write(f"Row {number}: {json.dumps(errors)}")
+
+        importer = AuctionImport(auctioneer, chunk_size=options["chunk_size"], on_error=on_error)
+        with open(options["path"], "rb") as source:
+            report = importer.run(read_rows(source, fmt))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['created']} auctions ({report['failed']} rows rejected)."
+        ))
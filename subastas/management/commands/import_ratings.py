@@ -0,0 +1,47 @@
+import csv
+from itertools import islice
+from django.core.management.base import BaseCommand, CommandError
+from subastas.models import Auction
+from subastas.services import upsert_ratings
+from usuarios.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ("Importa valoraciones desde un CSV con cabecera reviewer,auction,rating (reviewer es "
+            "el nombre de usuario). Cada lote se escribe con una única sentencia de upsert.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Fichero CSV a importar.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Valoraciones por lote.")
+
+    def handle(self, *args, **options):
+        imported = skipped = 0
+        with open(options["path"], newline="", encoding="utf-8") as source:
+            reader = csv.DictReader(source)
+            missing = {"reviewer", "auction", "rating"} - set(reader.fieldnames or [])
+            if missing:
+                raise CommandError(f"Missing columns: {', '.join(sorted(missing))}.")
+            while True:
+                batch = list(islice(reader, options["batch_size"]))
+                if not batch:
+                    break
+                rows = self.resolve(batch)
+                skipped += len(batch) - len(rows)
+                if rows:
+                    imported += len(upsert_ratings(rows))
+        self.stdout.write(self.style.SUCCESS(f"Imported {imported} ratings ({skipped} rows skipped)."))
+
+    def resolve(self, batch):
+        # Usuarios y subastas del lote en dos consultas; las filas que no cuadran se saltan
+        usernames = {row["reviewer"] for row in batch}
+        users = dict(CustomUser.objects.filter(username__in=usernames).values_list("username", "id"))
+        auction_ids = {int(row["auction"]) for row in batch if row["auction"].isdigit()}
+        auctions = set(Auction.objects.filter(pk__in=auction_ids).values_list("pk", flat=True))
+        rows = []
+        for row in batch:
+            if not row["auction"].isdigit() or not row["rating"].isdigit():
+                continue
+            auction_id, rating = int(row["auction"]), int(row["rating"])
+            if row["reviewer"] in users and auction_id in auctions and 1 <= rating <= 5:
+                rows.append((users[row["reviewer"]], auction_id, rating))
+        return rows
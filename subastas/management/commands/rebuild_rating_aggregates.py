@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from subastas.models import Auction
+from subastas.services import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = "Recalcula rating_sum y rating_count de las subastas a partir de la tabla Rating."
+
+    def add_arguments(self, parser):
+        parser.add_argument("auctions", nargs="*", type=int,
+                            help="Ids de las subastas a recalcular (por defecto, todas).")
+
+    def handle(self, *args, **options):
+        queryset = Auction.objects.all()
+        if options["auctions"]:
+            queryset = queryset.filter(pk__in=options["auctions"])
+        updated = rebuild_rating_aggregates(queryset)
+        self.stdout.write(self.style.SUCCESS(f"Rating aggregates rebuilt for {updated} auctions."))
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:18
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_rating_aggregates(apps, schema_editor):
+    Auction = apps.get_model("subastas", "Auction")
+    Rating = apps.get_model("subastas", "Rating")
+    totals = Rating.objects.values("auction").annotate(
+        total=Sum("rating"), count=Count("id")
+    )
+    for row in totals:
+        Auction.objects.filter(pk=row["auction"]).update(
+            rating_sum=row["total"], rating_count=row["count"]
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("subastas", "0009_comment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="auction",
+            name="rating_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="auction",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_rating_aggregates, migrations.RunPython.noop),
+    ]
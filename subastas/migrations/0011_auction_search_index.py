@@ -0,0 +1,20 @@
+from django.db import migrations
+from subastas.search import install_search_index, uninstall_search_index
+
+
+def install(apps, schema_editor):
+    install_search_index(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    uninstall_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("subastas", "0010_auction_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("subastas", "0011_auction_search_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="auction",
+            index=models.Index(
+                fields=["category", "price"], name="auction_category_price_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="auction",
+            index=models.Index(
+                fields=["closing_date"], name="auction_closing_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bid",
+            index=models.Index(
+                fields=["auction", "-price"], name="bid_auction_price_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bid",
+            index=models.Index(fields=["bidder"], name="bid_bidder_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(fields=["auction", "id"], name="comment_auction_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="rating",
+            index=models.Index(
+                fields=["auction", "reviewer"], name="rating_auction_reviewer_idx"
+            ),
+        ),
+    ]
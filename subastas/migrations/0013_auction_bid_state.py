@@ -0,0 +1,43 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:28
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def fill_bid_state(apps, schema_editor):
+    Auction = apps.get_model("subastas", "Auction")
+    Bid = apps.get_model("subastas", "Bid")
+    states = Bid.objects.values("auction").annotate(
+        highest=Max("price"), count=Count("id"), last=Max("creation_date")
+    )
+    for row in states:
+        Auction.objects.filter(pk=row["auction"]).update(
+            current_bid=row["highest"], bid_count=row["count"], last_bid_at=row["last"]
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("subastas", "0012_hot_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="auction",
+            name="bid_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="auction",
+            name="current_bid",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="auction",
+            name="last_bid_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_bid_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("subastas", "0013_auction_bid_state"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuctionResult",
+            fields=[
+                (
+                    "auction",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="result",
+                        serialize=False,
+                        to="subastas.auction",
+                    ),
+                ),
+                ("winner", models.CharField(blank=True, max_length=100, null=True)),
+                (
+                    "final_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                ("closed_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "ordering": ("auction",),
+            },
+        ),
+        migrations.AddField(
+            model_name="auction",
+            name="is_closed",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name="auction",
+            index=models.Index(
+                condition=models.Q(("is_closed", False)),
+                fields=["closing_date"],
+                name="auction_due_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="auctionresult",
+            name="winning_bid",
+            field=models.OneToOneField(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="subastas.bid",
+            ),
+        ),
+    ]
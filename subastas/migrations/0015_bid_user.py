@@ -0,0 +1,41 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_bid_user(apps, schema_editor):
+    # bidder guardaba el nombre de usuario; las pujas sin usuario que coincida se quedan sin user
+    Bid = apps.get_model("subastas", "Bid")
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    Bid.objects.update(
+        user=Subquery(User.objects.filter(username=OuterRef("bidder")).values("pk")[:1])
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("subastas", "0014_auction_results"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bid",
+            name="user",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="bids",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bid",
+            index=models.Index(fields=["user", "auction"], name="bid_user_auction_idx"),
+        ),
+        migrations.RunPython(fill_bid_user, migrations.RunPython.noop),
+    ]
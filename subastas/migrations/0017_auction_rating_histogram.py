@@ -0,0 +1,49 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:44
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_rating_histogram(apps, schema_editor):
+    Auction = apps.get_model("subastas", "Auction")
+    Rating = apps.get_model("subastas", "Rating")
+    counts = Rating.objects.values("auction", "rating").annotate(count=Count("id"))
+    for row in counts:
+        Auction.objects.filter(pk=row["auction"]).update(
+            **{f"rating_{row['rating']}": row["count"]}
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("subastas", "0016_proxy_bids"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="auction",
+            name="rating_1",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="auction",
+            name="rating_2",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="auction",
+            name="rating_3",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="auction",
+            name="rating_4",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="auction",
+            name="rating_5",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_rating_histogram, migrations.RunPython.noop),
+    ]
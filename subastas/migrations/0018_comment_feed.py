@@ -0,0 +1,36 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_comment_count(apps, schema_editor):
+    Auction = apps.get_model("subastas", "Auction")
+    Comment = apps.get_model("subastas", "Comment")
+    counts = Comment.objects.values("auction").annotate(count=Count("id"))
+    for row in counts:
+        Auction.objects.filter(pk=row["auction"]).update(comment_count=row["count"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("subastas", "0017_auction_rating_histogram"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="auction",
+            name="comment_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["auction", "-creation_date", "-id"],
+                name="comment_auction_recent_idx",
+            ),
+        ),
+        migrations.RunPython(fill_comment_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("subastas", "0018_comment_feed"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="bid",
+            name="bid_bidder_idx",
+        ),
+        migrations.AlterField(
+            model_name="bid",
+            name="user",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="bids",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
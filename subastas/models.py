@@ -2,6 +2,7 @@ from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from usuarios.models import CustomUser
 from decimal import Decimal
+from django.utils import timezone
 
 # Create your models here.
 class Category(models.Model):
@@ -13,6 +14,22 @@ class Category(models.Model):
         return self.name
     
     
+class AuctionQuerySet(models.QuerySet):
+    # Abierta/cerrada se resuelve en SQL sobre closing_date (indexado)
+    def open(self):
+        return self.filter(closing_date__gt=timezone.now())
+
+    def closed(self):
+        return self.filter(closing_date__lte=timezone.now())
+
+    def with_is_open(self):
+        return self.annotate(is_open=models.Case(
+            models.When(closing_date__gt=timezone.now(), then=models.Value(True)),
+            default=models.Value(False),
+            output_field=models.BooleanField(),
+        ))
+
+
 class Auction(models.Model):
     title = models.CharField(max_length=150)
     description = models.TextField()
@@ -31,11 +48,50 @@ class Auction(models.Model):
     brand = models.CharField(max_length=100)
     auctioneer = models.ForeignKey(CustomUser, related_name='auctions',
         on_delete=models.CASCADE, default=1)
+    # Agregados de valoraciones mantenidos por subastas.services (ver rebuild_rating_aggregates)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    # Número de valoraciones de cada estrella (histograma)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+    # Estado de las pujas, mantenido por subastas.services
+    current_bid = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    bid_count = models.PositiveIntegerField(default=0)
+    last_bid_at = models.DateTimeField(null=True, blank=True)
+    # Número de comentarios, mantenido por subastas.services
+    comment_count = models.PositiveIntegerField(default=0)
+    # Lo marca el programador de cierres (close_auctions) junto con AuctionResult
+    is_closed = models.BooleanField(default=False)
+
+    objects = AuctionQuerySet.as_manager()
 
     class Meta:
         ordering=('id',)
+        indexes=[
+            models.Index(fields=['category', 'price'], name='auction_category_price_idx'),
+            models.Index(fields=['closing_date'], name='auction_closing_date_idx'),
+            # Solo las subastas pendientes de cerrar (close_auctions)
+            models.Index(fields=['closing_date'], condition=models.Q(is_closed=False), name='auction_due_idx'),
+        ]
     def __str__(self):
         return self.title
+
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return None
+        return round(Decimal(self.rating_sum) / self.rating_count, 2)
+
+    @property
+    def rating_summary(self):
+        return {
+            "counts": {str(stars): getattr(self, f"rating_{stars}") for stars in range(1, 6)},
+            "total": self.rating_count,
+            "average": self.average_rating,
+        }
     
 
 class Bid(models.Model):
@@ -43,14 +99,57 @@ class Bid(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.00'))])
     creation_date = models.DateTimeField(auto_now_add=True)
     bidder = models.CharField(max_length=100)
+    # Usuario que puja; `bidder` se queda como nombre mostrado. Las pujas de un
+    # usuario borrado se conservan: forman parte del histórico de la subasta
+    user = models.ForeignKey(CustomUser, related_name='bids', on_delete=models.SET_NULL, null=True, blank=True)
 
     class Meta:  
         ordering=('id',)  
+        indexes=[
+            models.Index(fields=['auction', '-price'], name='bid_auction_price_idx'),
+            models.Index(fields=['user', 'auction'], name='bid_user_auction_idx'),
+        ]
  
     def __str__(self): 
         return self.bidder
 
 
+class ProxyBid(models.Model):
+    # Puja máxima oculta: el servidor puja por el usuario hasta max_price
+    auction = models.ForeignKey(Auction, related_name='proxy_bids', on_delete=models.CASCADE)
+    user = models.ForeignKey(CustomUser, related_name='proxy_bids', on_delete=models.CASCADE)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
+    creation_date = models.DateTimeField(auto_now_add=True)
+    update_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering=('id',)
+        constraints=[
+            models.UniqueConstraint(fields=['auction', 'user'], name='unique_proxy_bid_auction_user')
+        ]
+        indexes=[
+            # Las dos pujas máximas más altas de la subasta (a igualdad, la más antigua)
+            models.Index(fields=['auction', '-max_price', 'creation_date'], name='proxybid_auction_max_idx'),
+        ]
+
+    def __str__(self):
+        return f"Auction: {self.auction_id} - User: {self.user_id} - Max: {self.max_price}"
+
+
+class AuctionResult(models.Model):
+    auction = models.OneToOneField(Auction, related_name='result', on_delete=models.CASCADE, primary_key=True)
+    winning_bid = models.OneToOneField(Bid, related_name='+', on_delete=models.SET_NULL, null=True, blank=True)
+    winner = models.CharField(max_length=100, null=True, blank=True)
+    final_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    closed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering=('auction',)
+
+    def __str__(self):
+        return f"Auction: {self.auction_id} - Winner: {self.winner} - Price: {self.final_price}"
+
+
 class Rating(models.Model):
     rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)], default=1)
     reviewer = models.ForeignKey(CustomUser, related_name='ratings', on_delete=models.CASCADE)
@@ -61,6 +160,9 @@ class Rating(models.Model):
         constraints=[
             models.UniqueConstraint(fields=['reviewer', 'auction'], name='unique_reviewer_auction')
         ]
+        indexes=[
+            models.Index(fields=['auction', 'reviewer'], name='rating_auction_reviewer_idx'),
+        ]
 
     def __str__(self):
         return f"Auction: {self.auction} - Reviewer: {self.reviewer} - Rating: {self.rating}"
@@ -76,6 +178,11 @@ class Comment(models.Model):
 
     class Meta:
         ordering=('id',)
+        indexes=[
+            models.Index(fields=['auction', 'id'], name='comment_auction_id_idx'),
+            # Comentarios de cada subasta, los más recientes primero
+            models.Index(fields=['auction', '-creation_date', '-id'], name='comment_auction_recent_idx'),
+        ]
 
     def __str__(self):
         return f"Auction: {self.auction} - Author: {self.author} - Title: {self.title}"
\ No newline at end of file
@@ -0,0 +1,136 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Paginación por número de página (la de siempre) o, si la petición incluye el
+    parámetro `cursor`, paginación por clave (keyset): sin COUNT ni OFFSET, cada
+    página es un rango sobre el orden elegido, con el mismo coste sea cual sea.
+
+    La vista declara los órdenes disponibles en `keyset_orderings`, p.ej.
+    {"id": ("id",), "precio": ("price", "id")}. El primero es el de por defecto
+    y el cliente puede elegir otro con `orden`. El último campo debe ser único.
+    `?cursor=` (vacío) devuelve la primera página.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'orden'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        orderings = getattr(view, 'keyset_orderings', None) or {'id': ('id',)}
+        self.ordering_name, values, reverse = self.decode_cursor(request, orderings)
+        self.ordering = orderings[self.ordering_name]
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(self.flip(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            try:
+                queryset = queryset.filter(self.after(ordering, values))
+            except (ValueError, DjangoValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        model = queryset.model
+        first = self.position(model, results[0]) if results else None
+        last = self.position(model, results[-1]) if results else None
+        # Hacia delante: hay siguiente si sobra una fila y anterior si venimos de
+        # un cursor. Hacia atrás es al revés.
+        has_next = has_more if not reverse else values is not None
+        has_previous = values is not None if not reverse else has_more
+        self.next_cursor = self.encode_cursor(last, False) if has_next and last else None
+        self.previous_cursor = self.encode_cursor(first, True) if has_previous and first else None
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_cursor_link(self.next_cursor),
+            'previous': self.get_cursor_link(self.previous_cursor),
+            'results': data,
+        })
+
+    def get_cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    @staticmethod
+    def after(ordering, values):
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y), respetando el sentido de cada campo
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def position(self, model, obj):
+        values = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            try:
+                name = model._meta.get_field(name).attname
+            except FieldDoesNotExist:
+                pass
+            value = obj[name] if isinstance(obj, dict) else getattr(obj, name)
+            if isinstance(value, (datetime, date)):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        return values
+
+    def encode_cursor(self, values, reverse):
+        payload = json.dumps({'o': self.ordering_name, 'v': values, 'r': int(reverse)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, orderings):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            name = request.query_params.get(self.ordering_query_param, next(iter(orderings)))
+            if name not in orderings:
+                raise ValidationError(
+                    {self.ordering_query_param: f"Orden must be one of: {', '.join(orderings)}."}
+                )
+            return name, None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            name, values, reverse = payload['o'], payload['v'], bool(payload['r'])
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if name not in orderings or not isinstance(values, list) or len(values) != len(orderings[name]):
+            raise NotFound(self.invalid_cursor_message)
+        return name, values, reverse
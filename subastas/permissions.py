@@ -11,7 +11,7 @@ class IsOwnerOrAdmin(BasePermission):
         if request.method in SAFE_METHODS: 
             return True 
         
-        owner_fields = ['author', 'bidder']
+        owner_fields = ['author', 'user']
         for field in owner_fields:
             if hasattr(obj, field):
                 return getattr(obj, field) == request.user or request.user.is_staff
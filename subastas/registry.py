@@ -0,0 +1,82 @@
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+from .models import Category
+
+VERSION_KEY = "subastas:categories:version"
+SHARED_BACKENDS = (RedisCache, BaseMemcachedCache, DatabaseCache)
+
+
+class CategoryRegistry:
+    """
+    Copia en memoria del proceso de la tabla de categorías (nombre -> id e
+    id -> nombre). Se carga la primera vez que se usa y se vuelve a cargar cuando
+    cambia el sello de versión guardado en la caché, que cambia en cada
+    escritura. Con una caché compartida (Redis) la invalidación llega a todos
+    los procesos; con una caché local (LocMemCache) solo al que escribe, así
+    que los demás recargan su copia cada CATEGORY_REGISTRY_TTL segundos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._expires = 0
+        self._by_name = {}
+        self._by_id = {}
+
+    def _current_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            # Si la caché ha perdido el sello se crea uno nuevo, distinto de
+            # cualquier versión que tengan cargada los procesos
+            cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def _is_current(self, version):
+        return version is not None and version == self._version and time.monotonic() < self._expires
+
+    def _ensure_loaded(self):
+        version = self._current_version()
+        if self._is_current(version):
+            return
+        with self._lock:
+            if self._is_current(version):
+                return
+            rows = list(Category.objects.order_by('id').values_list('id', 'name'))
+            self._by_id = dict(rows)
+            self._by_name = {name: pk for pk, name in rows}
+            self._version = version
+            ttl = None if isinstance(caches['default'], SHARED_BACKENDS) else getattr(settings, 'CATEGORY_REGISTRY_TTL', 5)
+            self._expires = float('inf') if ttl is None else time.monotonic() + ttl
+
+    def get_id(self, name):
+        self._ensure_loaded()
+        pk = self._by_name.get(name)
+        if pk is None:
+            # Un fallo puede deberse a una categoría creada sin pasar por la API
+            # (p.ej. cargar_productos.py); se comprueba y se recarga si existe
+            pk = Category.objects.filter(name=name).values_list('id', flat=True).first()
+            if pk is not None:
+                self._version = None
+        return pk
+
+    def get_name(self, pk):
+        self._ensure_loaded()
+        return self._by_id.get(pk)
+
+    def all(self):
+        self._ensure_loaded()
+        return [{'id': pk, 'name': name} for pk, name in self._by_id.items()]
+
+    def invalidate(self):
+        cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        self._version = None
+
+
+category_registry = CategoryRegistry()
@@ -0,0 +1,131 @@
+import re
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+# Búsqueda de texto completo sobre título y descripción de las subastas.
+# En PostgreSQL se usa una columna tsvector generada con índice GIN y en SQLite
+# una tabla virtual FTS5 que se mantiene con triggers. En ambos casos el índice
+# se actualiza al crear o editar una subasta sin pasar por Django.
+
+SEARCH_CONFIG = "simple"
+FTS_TABLE = "subastas_auction_fts"
+
+POSTGRES_INSTALL = [
+    f"""
+    ALTER TABLE subastas_auction ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS subastas_auction_search_idx ON subastas_auction USING gin (search_vector)",
+]
+
+POSTGRES_UNINSTALL = [
+    "DROP INDEX IF EXISTS subastas_auction_search_idx",
+    "ALTER TABLE subastas_auction DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_TABLE = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, description,
+        content='subastas_auction', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+
+SQLITE_TRIGGERS = {
+    f"{FTS_TABLE}_ai": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON subastas_auction BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END
+    """,
+    f"{FTS_TABLE}_ad": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON subastas_auction BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        END
+    """,
+    f"{FTS_TABLE}_au": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, description ON subastas_auction BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END
+    """,
+}
+
+
+def install_search_index(connection):
+    """
+    Crea (si no existe) el índice de texto completo para el motor de la conexión.
+    Es idempotente: en SQLite vuelve a crear los triggers que se pierden cuando
+    una migración reconstruye la tabla de subastas y reindexa en ese caso.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            for sql in POSTGRES_INSTALL:
+                cursor.execute(sql)
+        elif connection.vendor == "sqlite":
+            cursor.execute(SQLITE_TABLE)
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'subastas_auction'")
+            existing = {row[0] for row in cursor.fetchall()}
+            missing = [name for name in SQLITE_TRIGGERS if name not in existing]
+            for name in missing:
+                cursor.execute(SQLITE_TRIGGERS[name])
+            if missing:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+def uninstall_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            for sql in POSTGRES_UNINSTALL:
+                cursor.execute(sql)
+        elif connection.vendor == "sqlite":
+            for name in SQLITE_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def search_auctions(queryset, text, rank=True):
+    """
+    Filtra las subastas cuyo título o descripción contienen todas las palabras
+    de `text` (como prefijo) y, si `rank`, las ordena por relevancia
+    (`search_rank`).
+    """
+    terms = re.findall(r"[^\W_]+", text)
+    if not terms:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        tsquery = " & ".join(f"{term}:*" for term in terms)
+        queryset = queryset.filter(RawSQL(
+            f"subastas_auction.search_vector @@ to_tsquery('{SEARCH_CONFIG}', %s)",
+            (tsquery,), output_field=BooleanField(),
+        ))
+        rank_sql = f"ts_rank(subastas_auction.search_vector, to_tsquery('{SEARCH_CONFIG}', %s))"
+        rank_params = (tsquery,)
+    elif vendor == "sqlite":
+        match = " ".join('"%s"*' % term.replace('"', '""') for term in terms)
+        # Un solo MATCH unido por rowid: bm25 se calcula en esa misma consulta
+        # y no con una subconsulta por fila. El "+" impide que SQLite busque en
+        # la tabla FTS por rowid, lo que repetiría el MATCH para cada subasta
+        # (p.ej. si hay filtro de categoría y precio); así la recorre una vez.
+        queryset = queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f"{FTS_TABLE} MATCH %s", f"+{FTS_TABLE}.rowid = subastas_auction.id"],
+            params=[match],
+        )
+        if not rank:
+            return queryset
+        # bm25 devuelve valores más bajos cuanto más relevante; el título pesa más
+        return queryset.extra(select={"search_rank": f"-bm25({FTS_TABLE}, 10.0, 1.0)"}) \
+            .order_by("-search_rank", "id")
+    else:
+        return queryset.filter(Q(title__icontains=text) | Q(description__icontains=text))
+
+    if not rank:
+        return queryset
+    return queryset.annotate(
+        search_rank=RawSQL(rank_sql, rank_params, output_field=FloatField())
+    ).order_by("-search_rank", "id")
@@ -0,0 +1,178 @@
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from .models import Auction, Bid
+from .events import broker
+from .caching import touch_auction
+
+# Secuenciador de pujas para las subastas "calientes" (a punto de cerrar). En
+# lugar de competir todas las peticiones por la misma fila, cada proceso manda
+# las pujas de una subasta a un único hilo que las decide en orden de llegada
+# contra la puja más alta en memoria y las guarda por lotes con bulk_create.
+# Cada lote bloquea la fila de la subasta (select_for_update) y parte de la puja
+# más alta guardada, así que varios procesos con su propio secuenciador siguen
+# sin poder aceptar dos pujas que no se superen entre sí.
+
+BATCH_SIZE = 50
+IDLE_SECONDS = 5
+RESULT_TIMEOUT = 10
+
+
+class SequencerBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The auction is receiving too many bids. The bid was not placed, try again."
+    default_code = "sequencer_busy"
+
+
+class AuctionSequencer:
+    """Hilo que decide y guarda en orden las pujas de una subasta."""
+
+    def __init__(self, auction_id, on_exit):
+        self.auction_id = auction_id
+        self.queue = queue.Queue()
+        self.on_exit = on_exit
+        self.thread = threading.Thread(target=self.run, name=f"bid-sequencer-{auction_id}", daemon=True)
+
+    def submit(self, price, bidder, user=None):
+        future = Future()
+        self.queue.put((price, bidder, user, future))
+        return future
+
+    def run(self):
+        try:
+            while True:
+                try:
+                    batch = [self.queue.get(timeout=IDLE_SECONDS)]
+                except queue.Empty:
+                    if self.on_exit(self):
+                        return
+                    continue
+                # Lo que se haya acumulado mientras se guardaba el lote anterior
+                # entra en el siguiente, sin esperar a que se llene
+                while len(batch) < BATCH_SIZE:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                self.process(batch)
+        finally:
+            close_old_connections()
+            connection.close()
+
+    def process(self, batch):
+        # Las pujas que ya no espera nadie (submit se cansó de esperar y las
+        # canceló) no se guardan
+        batch = [entry for entry in batch if entry[-1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            results = self.persist(batch)
+        except Exception as exc:
+            for *_, future in batch:
+                future.set_exception(exc)
+            return
+        for (*_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def persist(self, batch):
+        now = timezone.now()
+        with transaction.atomic():
+            auction = Auction.objects.select_for_update() \
+                .filter(pk=self.auction_id).values("closing_date", "current_bid").first()
+            if auction is None:
+                return [NotFound("The auction does not exist.")] * len(batch)
+            if auction["closing_date"] <= now:
+                return [ValidationError({"auction": [
+                    "The auction has already closed. No more bids are allowed."
+                ]})] * len(batch)
+
+            highest = auction["current_bid"]
+            results, accepted = [], []
+            for price, bidder, user, _ in batch:
+                if highest is not None and price <= highest:
+                    results.append(ValidationError({"price": [
+                        f"The new bid price must be higher than the previous winning bid ({highest})."
+                    ]}))
+                    continue
+                highest = price
+                bid = Bid(auction_id=self.auction_id, price=price, bidder=bidder, user=user)
+                results.append(bid)
+                accepted.append(bid)
+            if not accepted:
+                return results
+
+            Bid.objects.bulk_create(accepted)
+            Auction.objects.filter(pk=self.auction_id).update(
+                current_bid=highest, bid_count=F("bid_count") + len(accepted),
+                last_bid_at=accepted[-1].creation_date,
+            )
+            touch_auction(self.auction_id)
+            for bid in accepted:
+                broker.publish_on_commit(self.auction_id, "bid", {
+                    "id": bid.id, "price": bid.price, "bidder": bid.bidder, "creation_date": bid.creation_date,
+                })
+            broker.publish_on_commit(self.auction_id, "price", {"current_bid": highest})
+        return results
+
+
+class BidSequencer:
+    """
+    Reparte las pujas entre los secuenciadores de cada subasta. Solo se usa si
+    AUCTION_BID_SEQUENCER está activo y a la subasta le quedan menos de
+    AUCTION_BID_SEQUENCER_WINDOW segundos; el resto sigue por place_bid.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sequencers = {}
+
+    def enabled(self):
+        return getattr(settings, "AUCTION_BID_SEQUENCER", False)
+
+    def is_hot(self, auction_id):
+        if auction_id in self._sequencers:
+            return True
+        closing_date = Auction.objects.filter(pk=auction_id).values_list("closing_date", flat=True).first()
+        if closing_date is None:
+            return False
+        remaining = (closing_date - timezone.now()).total_seconds()
+        return remaining < getattr(settings, "AUCTION_BID_SEQUENCER_WINDOW", 600)
+
+    def submit(self, auction_id, price, bidder, user=None):
+        """Encola la puja y espera a que el secuenciador la acepte (devuelve la Bid) o rechace."""
+        with self._lock:
+            sequencer = self._sequencers.get(auction_id)
+            if sequencer is None:
+                sequencer = AuctionSequencer(auction_id, self._release)
+                self._sequencers[auction_id] = sequencer
+                sequencer.thread.start()
+            future = sequencer.submit(price, bidder, user)
+        try:
+            return future.result(timeout=RESULT_TIMEOUT)
+        except FutureTimeoutError:
+            # Si aún está en la cola se retira y no llegará a guardarse; si ya
+            # se está guardando, el lote termina enseguida y se espera a él
+            if future.cancel():
+                raise SequencerBusy()
+            return future.result()
+
+    def _release(self, sequencer):
+        # Un secuenciador sin pujas se retira; si ha llegado alguna mientras
+        # tanto, sigue trabajando
+        with self._lock:
+            if not sequencer.queue.empty():
+                return False
+            self._sequencers.pop(sequencer.auction_id, None)
+            return True
+
+
+bid_sequencer = BidSequencer()
@@ -1,9 +1,11 @@
 from drf_spectacular.utils import extend_schema_field 
 from rest_framework import serializers 
 from django.utils import timezone 
-from .models import Category, Auction, Bid, Rating, Comment
+from django.db import transaction
+from .models import Category, Auction, AuctionResult, Bid, ProxyBid, Rating, Comment
+from .registry import category_registry
+from .state import get_auction_state
 from datetime import timedelta
-from django.db.models import Avg
 
 
 class CategoryListCreateSerializer(serializers.ModelSerializer): 
@@ -17,26 +19,69 @@ class CategoryDetailSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class AuctionListCreateSerializer(serializers.ModelSerializer): 
+def requested_fields(request):
+    """Campos pedidos con ?fields=a,b,c en una lectura, o None si no se piden."""
+    if request is None or request.method != "GET" or not request.query_params.get("fields"):
+        return None
+    return {name.strip() for name in request.query_params["fields"].split(",") if name.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Permite a los clientes pedir solo algunos campos (?fields=id,title,price).
+    `id` se incluye siempre (la caché de respuestas lo usa para saber qué
+    subastas contienen). `field_sources` indica de qué campos del modelo
+    depende cada campo calculado.
+    """
+    field_sources = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = requested_fields(self.context.get("request"))
+        if requested is None:
+            return
+        unknown = requested - set(self.fields)
+        if unknown:
+            raise serializers.ValidationError({"fields": f"Unknown fields: {', '.join(sorted(unknown))}."})
+        for name in set(self.fields) - requested - {"id"}:
+            self.fields.pop(name)
+
+    @classmethod
+    def model_fields(cls, requested):
+        """Campos del modelo que hay que cargar (.only()) para servir `requested`."""
+        concrete = {field.name for field in cls.Meta.model._meta.concrete_fields}
+        names = {"id"}
+        for name in requested:
+            names.update(cls.field_sources.get(name, [name]))
+        return sorted(names & concrete)
+
+
+class AuctionListCreateSerializer(SparseFieldsMixin, serializers.ModelSerializer): 
     # Estos dos campos los podemos usar así porque existían en el modelo
     creation_date = serializers.DateTimeField(format="%Y-%m-%dT%H:%M:%SZ", read_only=True)  # read_only=True para que no se pueda modifiar la fecha. Si no lo pongo, aparece creation_date para modificarla y no queremos eso.
     closing_date = serializers.DateTimeField(format="%Y-%m-%dT%H:%M:%SZ") 
     # El isOpen no es del modelo, por lo que tenemos que crearlo como un serializador
     isOpen = serializers.SerializerMethodField(read_only=True) 
     average_rating = serializers.SerializerMethodField()
+    field_sources = {"isOpen": ["closing_date"], "average_rating": ["rating_sum", "rating_count"]}
 
     class Meta: 
         model = Auction 
         fields = '__all__' 
+        read_only_fields = ['rating_sum', 'rating_count', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5',
+                            'current_bid', 'bid_count', 'last_bid_at', 'is_closed', 'comment_count']
 
     @extend_schema_field(serializers.BooleanField())
     def get_isOpen(self, obj): 
-        return obj.closing_date > timezone.now()
+        # Las vistas anotan is_open en la consulta (Auction.objects.with_is_open())
+        is_open = getattr(obj, "is_open", None)
+        if is_open is None:
+            return obj.closing_date > timezone.now()
+        return is_open
     
     @extend_schema_field(serializers.DecimalField(max_digits=3, decimal_places=2))
     def get_average_rating(self, obj):
-        avg = obj.ratings.aggregate(avg=Avg("rating"))["avg"]
-        return round(avg, 2) if avg is not None else None
+        return obj.average_rating
     
     def validate_closing_date(self, value):
         if value <= timezone.now():
@@ -46,9 +91,12 @@ class AuctionListCreateSerializer(serializers.ModelSerializer):
                                               greater than creation date.")
         return value
     
+    @transaction.atomic
     def create(self, validated_data):
         request = self.context["request"]
-        auction = Auction.objects.create(**validated_data, auctioneer=request.user)
+        # La valoración inicial del subastador ya se cuenta en los agregados
+        auction = Auction.objects.create(**validated_data, auctioneer=request.user,
+                                         rating_sum=1, rating_count=1, rating_1=1)
         Rating.objects.create(
             auction=auction,
             reviewer=self.context["request"].user,
@@ -56,30 +104,79 @@ class AuctionListCreateSerializer(serializers.ModelSerializer):
         )
         return auction
     
+class RatingSummarySerializer(serializers.Serializer):
+    # Histograma de valoraciones mantenido en la propia subasta (rating_1..rating_5)
+    counts = serializers.DictField(child=serializers.IntegerField())
+    total = serializers.IntegerField()
+    average = serializers.DecimalField(max_digits=3, decimal_places=2, allow_null=True)
+
+
+class AuctionImportSerializer(AuctionListCreateSerializer):
+    # Filas de la importación masiva (subastas/importer.py): la categoría se
+    # acepta por id o por nombre y se resuelve con el registro, sin consultas
+    category = serializers.CharField()
+
+    class Meta(AuctionListCreateSerializer.Meta):
+        # El vendedor es quien importa, nunca una columna del fichero
+        read_only_fields = AuctionListCreateSerializer.Meta.read_only_fields + ['auctioneer']
+
+    def validate_category(self, value):
+        if value.isdigit() and category_registry.get_name(int(value)) is not None:
+            return int(value)
+        pk = category_registry.get_id(value)
+        if pk is None:
+            raise serializers.ValidationError(f"Unknown category: {value}.")
+        return pk
+
+
+class AuctionResultSerializer(serializers.ModelSerializer):
+    closed_at = serializers.DateTimeField(format="%Y-%m-%dT%H:%M:%SZ", read_only=True)
+
+    class Meta:
+        model = AuctionResult
+        fields = ['winning_bid', 'winner', 'final_price', 'closed_at']
+
 class AuctionDetailSerializer(serializers.ModelSerializer): 
     creation_date = serializers.DateTimeField(format="%Y-%m-%dT%H:%M:%SZ", read_only=True) 
     closing_date = serializers.DateTimeField(format="%Y-%m-%dT%H:%M:%SZ")
+    # Resultado guardado al cerrar la subasta (null mientras siga abierta)
+    result = AuctionResultSerializer(read_only=True, allow_null=True)
     isOpen = serializers.SerializerMethodField(read_only=True)
     average_rating = serializers.SerializerMethodField()
     user_rating = serializers.SerializerMethodField(required=False)
+    rating_summary = serializers.SerializerMethodField()
 
     class Meta: 
         model = Auction 
         fields = '__all__' 
-        read_only_fields = ['auctioneer', 'creation_date']
+        read_only_fields = ['auctioneer', 'creation_date', 'rating_sum', 'rating_count',
+                            'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5',
+                            'current_bid', 'bid_count', 'last_bid_at', 'is_closed', 'comment_count']
 
     @extend_schema_field(serializers.BooleanField())
     def get_isOpen(self, obj): 
-        return obj.closing_date > timezone.now()
+        # Las vistas anotan is_open en la consulta (Auction.objects.with_is_open())
+        is_open = getattr(obj, "is_open", None)
+        if is_open is None:
+            return obj.closing_date > timezone.now()
+        return is_open
     
     @extend_schema_field(serializers.DecimalField(max_digits=3, decimal_places=2))
     def get_average_rating(self, obj):
-        avg = obj.ratings.aggregate(avg=Avg("rating"))["avg"]
-        return round(avg, 2) if avg is not None else None
+        return obj.average_rating
+
+    @extend_schema_field(RatingSummarySerializer())
+    def get_rating_summary(self, obj):
+        return RatingSummarySerializer(obj.rating_summary).data
 
     @extend_schema_field(serializers.IntegerField())
     def get_user_rating(self, obj):
         request = self.context.get("request")
+        # Las vistas que serializan varias subastas pasan las valoraciones del
+        # usuario ya leídas, {auction_id: rating}
+        user_ratings = self.context.get("user_ratings")
+        if user_ratings is not None:
+            return user_ratings.get(obj.pk)
         if request and request.user.is_authenticated:
             rating = obj.ratings.filter(reviewer=request.user).first()
             if rating:
@@ -101,20 +198,21 @@ class BidListCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Bid
         fields = '__all__'
+        read_only_fields = ['user']
 
-    def validate_price(self, value):
-        auction = self.initial_data.get("auction")
-        if auction:
-            last_winning_bid = Bid.objects.filter(auction=auction).order_by("-price").first() # sort descending
-            if last_winning_bid and value <= last_winning_bid.price:
-                raise serializers.ValidationError(
-                    f"The new bid price must be higher than the previous winning bid ({last_winning_bid.price})."
-                )
-        return value
+    def validate(self, data):
+        auction = data.get("auction")
+        if auction is None:
+            return data
+        current_bid = get_auction_state(auction.pk, self.context.get("request")).current_bid
+        if current_bid is not None and data["price"] <= current_bid:
+            raise serializers.ValidationError({"price": [
+                f"The new bid price must be higher than the previous winning bid ({current_bid})."
+            ]})
+        return data
     
     def validate_auction(self, value):
-        auction_serializer = AuctionListCreateSerializer(value)
-        if not auction_serializer.data["isOpen"]:
+        if not get_auction_state(value.pk, self.context.get("request")).is_open:
             raise serializers.ValidationError("The auction has already closed. No more bids are allowed.")
         return value
 
@@ -123,23 +221,67 @@ class BidDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = Bid
         fields = '__all__'
+        # La puja no puede cambiar de subasta: solo se recalcularía la nueva
+        read_only_fields = ['user', 'auction']
 
     def validate_price(self, value):
-        auction = self.instance.auction if self.instance else None
-        if auction:
-            last_winning_bid = Bid.objects.filter(auction=auction).order_by("-price").first() # sort descending
-            if last_winning_bid and value <= last_winning_bid.price:
+        if self.instance:
+            current_bid = get_auction_state(self.instance.auction_id, self.context.get("request")).current_bid
+            if current_bid is not None and value <= current_bid:
                 raise serializers.ValidationError(
                     "The new bid price must be higher than the previous winning bid."
                 )
         return value
     
-    def validate_auction(self, value):
-        auction_serializer = AuctionListCreateSerializer(value)
-        if not auction_serializer.data["isOpen"]:
+    def validate(self, attrs):
+        if self.instance and not get_auction_state(self.instance.auction_id, self.context.get("request")).is_open:
+            raise serializers.ValidationError({"auction": "The auction has already closed. No more bids are allowed."})
+        return attrs
+    
+
+class ProxyBidSerializer(serializers.ModelSerializer):
+    creation_date = serializers.DateTimeField(format="%Y-%m-%dT%H:%M:%SZ", read_only=True)
+    update_date = serializers.DateTimeField(format="%Y-%m-%dT%H:%M:%SZ", read_only=True)
+
+    class Meta:
+        model = ProxyBid
+        fields = ['auction', 'max_price', 'creation_date', 'update_date']
+        read_only_fields = ['auction']
+
+    def validate_max_price(self, value):
+        auction = self.context["auction"]
+        if auction.closing_date <= timezone.now():
             raise serializers.ValidationError("The auction has already closed. No more bids are allowed.")
+        if auction.current_bid is not None and value <= auction.current_bid:
+            raise serializers.ValidationError(
+                f"The maximum bid must be higher than the current winning bid ({auction.current_bid})."
+            )
         return value
-    
+
+
+class UserBidSummarySerializer(serializers.Serializer):
+    # Una fila por subasta de la consulta agrupada de UserBidListView
+    auction = serializers.IntegerField(source="auction_id")
+    title = serializers.CharField(source="auction__title")
+    thumbnail = serializers.URLField(source="auction__thumbnail")
+    closing_date = serializers.DateTimeField(source="auction__closing_date", format="%Y-%m-%dT%H:%M:%SZ")
+    current_bid = serializers.DecimalField(source="auction__current_bid", max_digits=10, decimal_places=2)
+    bid_count = serializers.IntegerField(source="auction__bid_count")
+    my_highest_bid = serializers.DecimalField(max_digits=10, decimal_places=2)
+    my_bid_count = serializers.IntegerField()
+    my_last_bid_at = serializers.DateTimeField(format="%Y-%m-%dT%H:%M:%SZ")
+    isOpen = serializers.SerializerMethodField()
+    winning = serializers.SerializerMethodField()
+
+    @extend_schema_field(serializers.BooleanField())
+    def get_isOpen(self, row):
+        return row["auction__closing_date"] > timezone.now()
+
+    @extend_schema_field(serializers.BooleanField())
+    def get_winning(self, row):
+        # Las pujas aceptadas siempre superan a la anterior: no hay empates
+        return row["my_highest_bid"] == row["auction__current_bid"]
+
 
 class RatingListCreateSerializer(serializers.ModelSerializer):
     reviewer = serializers.HiddenField(default=serializers.CurrentUserDefault())
@@ -148,11 +290,26 @@ class RatingListCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Rating
         fields = '__all__'
+        # Valorar otra vez la misma subasta actualiza la valoración (services.upsert_ratings)
+        validators = []
 
-    def validate(self, data):
-        if Rating.objects.filter(reviewer=data['reviewer'], auction=data['auction']).exists():
-            raise serializers.ValidationError("You have already rated this auction.")
-        return data
+
+class RatingBulkItemSerializer(serializers.Serializer):
+    auction = serializers.IntegerField()
+    rating = serializers.IntegerField(min_value=1, max_value=5)
+
+
+class RatingBulkSerializer(serializers.Serializer):
+    ratings = RatingBulkItemSerializer(many=True, allow_empty=False, max_length=1000)
+
+    def validate_ratings(self, value):
+        ids = {item["auction"] for item in value}
+        missing = ids - set(Auction.objects.filter(pk__in=ids).values_list("pk", flat=True))
+        if missing:
+            raise serializers.ValidationError(
+                f"Some of the auctions do not exist: {', '.join(map(str, sorted(missing)))}."
+            )
+        return value
     
 class RatingRetrieveSerializer(serializers.ModelSerializer):
     reviewer = serializers.HiddenField(default=serializers.CurrentUserDefault())
@@ -165,8 +322,7 @@ class RatingRetrieveSerializer(serializers.ModelSerializer):
 
     @extend_schema_field(serializers.DecimalField(max_digits=3, decimal_places=2))
     def get_average_rating(self, obj):
-        avg = Rating.objects.filter(auction=obj.auction).aggregate(avg=Avg("rating"))["avg"]
-        return round(avg, 2) if avg is not None else None
+        return obj.auction.average_rating
     
 class RatingUpdateDestroySerializer(serializers.ModelSerializer):
     reviewer = serializers.HiddenField(default=serializers.CurrentUserDefault())
@@ -209,12 +365,6 @@ class CommentListCreateSerializer(serializers.ModelSerializer):
         if len(value) > 100:
             raise serializers.ValidationError("Title must bu shorter than 100 characters")
         return value
-    
-    def validate_auction(self, value):
-        auction_serializer = AuctionListCreateSerializer(value)
-        if not auction_serializer.data["isOpen"]:
-            raise serializers.ValidationError("The auction has already closed. No more bids are allowed.")
-        return value
 
 class CommentDetailSerializer(serializers.ModelSerializer):
     creation_date = serializers.DateTimeField(format="%Y-%m-%dT%H:%M:%SZ", read_only=True) 
@@ -229,9 +379,3 @@ class CommentDetailSerializer(serializers.ModelSerializer):
         if len(value) > 100:
             raise serializers.ValidationError("Title must bu shorter than 100 characters")
         return value
-    
-    def validate_auction(self, value):
-        auction_serializer = AuctionListCreateSerializer(value)
-        if not auction_serializer.data["isOpen"]:
-            raise serializers.ValidationError("The auction has already closed. No more bids are allowed.")
-        return value
@@ -0,0 +1,325 @@
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ValidationError
+from .models import Auction, AuctionResult, Bid, Comment, ProxyBid, Rating
+from .events import broker
+from .caching import auction_version_key, touch_auction, touch_auctions, touch_listing, renew_versions
+
+
+# Agregados de valoraciones de cada subasta (suma, número e histograma por
+# estrellas). Se actualizan con expresiones F() para que dos escrituras
+# concurrentes no se pisen; las altas van por upsert_ratings. El recálculo
+# completo (rebuild_rating_aggregates) queda para el comando del mismo nombre.
+def star_field(value):
+    return f"rating_{value}"
+
+def rating_changed(auction_id, old_value, new_value):
+    if old_value == new_value:
+        return
+    Auction.objects.filter(pk=auction_id).update(
+        rating_sum=F("rating_sum") + (new_value - old_value),
+        **{star_field(old_value): F(star_field(old_value)) - 1,
+           star_field(new_value): F(star_field(new_value)) + 1},
+    )
+    touch_auction(auction_id)
+
+def rating_removed(auction_id, value):
+    Auction.objects.filter(pk=auction_id).update(
+        rating_sum=F("rating_sum") - value,
+        rating_count=F("rating_count") - 1,
+        **{star_field(value): F(star_field(value)) - 1},
+    )
+    touch_auction(auction_id)
+
+def rebuild_rating_aggregates(queryset=None):
+    """
+    Recalcula rating_sum, rating_count y el histograma a partir de la tabla
+    Rating en una sola sentencia UPDATE. Devuelve el número de subastas
+    actualizadas.
+    """
+    if queryset is None:
+        queryset = Auction.objects.all()
+    ratings = Rating.objects.filter(auction=OuterRef("pk")).order_by().values("auction")
+    renew_versions([auction_version_key(pk) for pk in queryset.values_list("pk", flat=True)])
+    return queryset.update(
+        rating_sum=Coalesce(Subquery(ratings.annotate(total=Sum("rating")).values("total")), Value(0)),
+        rating_count=Coalesce(Subquery(ratings.annotate(count=Count("id")).values("count")), Value(0)),
+        **{
+            star_field(stars): Coalesce(Subquery(ratings.filter(rating=stars).annotate(count=Count("id"))
+                                                 .values("count")), Value(0))
+            for stars in range(1, 6)
+        },
+    )
+
+
+def lock_auctions(auction_ids):
+    """Bloquea las filas de las subastas (en orden de id) hasta el final de la transacción."""
+    list(Auction.objects.select_for_update().filter(pk__in=auction_ids).order_by("pk").values_list("pk", flat=True))
+
+def upsert_ratings(rows):
+    """
+    Crea o actualiza valoraciones (reviewer_id, auction_id, rating) con una sola
+    sentencia INSERT ... ON CONFLICT sobre unique_reviewer_auction y aplica a
+    los agregados de cada subasta afectada la diferencia con las valoraciones
+    que ya había. Si un par se repite, gana el último.
+    """
+    ratings = {(reviewer_id, auction_id): value for reviewer_id, auction_id, value in rows}
+    auction_ids = sorted({auction_id for _, auction_id in ratings})
+    reviewer_ids = {reviewer_id for reviewer_id, _ in ratings}
+    with transaction.atomic():
+        # Con las subastas bloqueadas nadie puede cambiar sus valoraciones entre
+        # la lectura de las anteriores y el upsert
+        lock_auctions(auction_ids)
+        previous = {
+            (reviewer_id, auction_id): value
+            for reviewer_id, auction_id, value in Rating.objects.filter(auction_id__in=auction_ids, reviewer_id__in=reviewer_ids)
+            .values_list("reviewer_id", "auction_id", "rating")
+            if (reviewer_id, auction_id) in ratings
+        }
+        saved = Rating.objects.bulk_create(
+            [Rating(reviewer_id=reviewer_id, auction_id=auction_id, rating=value)
+             for (reviewer_id, auction_id), value in ratings.items()],
+            update_conflicts=True, unique_fields=["reviewer", "auction"], update_fields=["rating"],
+        )
+
+        deltas = {}
+        for key, value in ratings.items():
+            old_value = previous.get(key)
+            if old_value == value:
+                continue
+            delta = deltas.setdefault(key[1], {"rating_sum": 0, "rating_count": 0})
+            delta["rating_sum"] += value - (old_value or 0)
+            delta[star_field(value)] = delta.get(star_field(value), 0) + 1
+            if old_value is None:
+                delta["rating_count"] += 1
+            else:
+                delta[star_field(old_value)] = delta.get(star_field(old_value), 0) - 1
+        for auction_id, delta in deltas.items():
+            changes = {field: F(field) + change for field, change in delta.items() if change}
+            if changes:
+                Auction.objects.filter(pk=auction_id).update(**changes)
+                touch_auction(auction_id)
+    return saved
+
+
+# Número de comentarios de cada subasta, para las tarjetas de los listados
+def comment_added(auction_id):
+    Auction.objects.filter(pk=auction_id).update(comment_count=F("comment_count") + 1)
+    touch_auction(auction_id)
+
+def comment_removed(auction_id):
+    Auction.objects.filter(pk=auction_id).update(comment_count=F("comment_count") - 1)
+    touch_auction(auction_id)
+
+def rebuild_comment_counts(queryset=None):
+    """
+    Recalcula comment_count a partir de la tabla Comment en una sola sentencia
+    UPDATE. Devuelve el número de subastas actualizadas.
+    """
+    if queryset is None:
+        queryset = Auction.objects.all()
+    comments = Comment.objects.filter(auction=OuterRef("pk")).order_by().values("auction")
+    renew_versions([auction_version_key(pk) for pk in queryset.values_list("pk", flat=True)])
+    return queryset.update(
+        comment_count=Coalesce(Subquery(comments.annotate(count=Count("id")).values("count")), Value(0)),
+    )
+
+
+# Borrado de usuarios. Sus subastas, comentarios y valoraciones se borran en
+# cascada sin pasar por comment_removed ni rating_removed, así que hay que
+# descontarlos de los agregados e invalidar la caché antes, en la misma
+# transacción que el borrado.
+def users_removed(user_ids):
+    """Descuenta de cada subasta lo que se va a borrar en cascada con los usuarios."""
+    auction_ids = list(Auction.objects.filter(auctioneer_id__in=user_ids).values_list("pk", flat=True))
+    if auction_ids:
+        touch_auctions(auction_ids, listing=True)
+
+    comments = Comment.objects.filter(author_id__in=user_ids).order_by().values("auction") \
+        .annotate(count=Count("id")).values_list("auction", "count")
+    for auction_id, count in comments:
+        Auction.objects.filter(pk=auction_id).update(comment_count=F("comment_count") - count)
+        touch_auction(auction_id)
+
+    ratings = Rating.objects.filter(reviewer_id__in=user_ids).order_by().values("auction").annotate(
+        total=Sum("rating"), count=Count("id"),
+        **{star_field(stars): Count("id", filter=Q(rating=stars)) for stars in range(1, 6)},
+    )
+    for row in ratings:
+        Auction.objects.filter(pk=row["auction"]).update(
+            rating_sum=F("rating_sum") - row["total"],
+            rating_count=F("rating_count") - row["count"],
+            **{star_field(stars): F(star_field(stars)) - row[star_field(stars)]
+               for stars in range(1, 6) if row[star_field(stars)]},
+        )
+        touch_auction(row["auction"])
+
+
+# Estado de las pujas de cada subasta (puja más alta, número de pujas y fecha de
+# la última), para no tener que recorrer la tabla Bid al validar o listar.
+def place_bid(auction_id, price, bidder, user=None):
+    """
+    Acepta una puja de forma atómica: un UPDATE condicional sube la puja más
+    alta solo si la subasta sigue abierta y `price` la supera, y en la misma
+    transacción se inserta la puja. Dos pujas concurrentes no pueden ganar las
+    dos, porque la segunda ya no cumple la condición del UPDATE.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        accepted = Auction.objects.filter(pk=auction_id, closing_date__gt=now) \
+            .filter(Q(current_bid__isnull=True) | Q(current_bid__lt=price)) \
+            .update(current_bid=price, bid_count=F("bid_count") + 1, last_bid_at=now)
+        if not accepted:
+            raise_bid_rejected(auction_id)
+        bid = Bid.objects.create(auction_id=auction_id, price=price, bidder=bidder, user=user)
+        touch_auction(auction_id)
+        broker.publish_on_commit(auction_id, "bid", {
+            "id": bid.id, "price": bid.price, "bidder": bid.bidder, "creation_date": bid.creation_date,
+        })
+        broker.publish_on_commit(auction_id, "price", {"current_bid": price})
+    return bid
+
+def submit_bid(auction_id, price, bidder, user=None):
+    """
+    Punto de entrada de las pujas de la API: las subastas a punto de cerrar
+    pasan por el secuenciador (subastas/sequencer.py) si está activo. Después
+    responden las pujas automáticas.
+    """
+    from .sequencer import bid_sequencer
+
+    if bid_sequencer.enabled() and bid_sequencer.is_hot(auction_id):
+        bid = bid_sequencer.submit(auction_id, price, bidder, user)
+    else:
+        bid = place_bid(auction_id, price, bidder, user)
+    resolve_proxy_bids(auction_id)
+    return bid
+
+# Pujas automáticas (ProxyBid). Tras cada puja se miran solo las dos pujas
+# máximas más altas de la subasta: la primera puja lo justo para superar a la
+# segunda y a la puja actual, sin cadenas de pujas intermedias.
+PROXY_ATTEMPTS = 3
+
+def resolve_proxy_bids(auction_id):
+    """
+    Hace que la puja máxima más alta vaya ganando, si puede. La puja resultante
+    pasa por BidListCreateSerializer y place_bid, igual que una manual.
+    Devuelve la puja creada o None.
+    """
+    from .serializers import BidListCreateSerializer
+
+    increment = Decimal(getattr(settings, "AUCTION_PROXY_INCREMENT", "1.00"))
+    for _ in range(PROXY_ATTEMPTS):
+        proxies = list(ProxyBid.objects.filter(auction=auction_id).select_related("user")
+                       .order_by("-max_price", "creation_date")[:2])
+        if not proxies:
+            return None
+        top, runner = proxies[0], proxies[1] if len(proxies) > 1 else None
+        leader = Bid.objects.filter(auction=auction_id).order_by("-price", "id").values("price", "user").first()
+
+        if leader is None:
+            # Primera puja: el precio de salida o lo justo para superar a la segunda
+            target = Auction.objects.filter(pk=auction_id).values_list("price", flat=True).first()
+            if target is None:
+                return None
+            if runner is not None:
+                target = max(target, runner.max_price + increment)
+        else:
+            competitors = []
+            if leader["user"] != top.user_id:
+                competitors.append(leader["price"])
+            if runner is not None and runner.max_price > leader["price"]:
+                competitors.append(runner.max_price)
+            if not competitors:
+                return None
+            target = max(competitors) + increment
+        target = min(target, top.max_price)
+        if leader is not None and target <= leader["price"]:
+            return None
+
+        serializer = BidListCreateSerializer(data={
+            "auction": auction_id, "price": target, "bidder": top.user.username,
+        })
+        if not serializer.is_valid():
+            return None
+        try:
+            return place_bid(auction_id, target, top.user.username, top.user)
+        except ValidationError:
+            # Otra puja se ha adelantado: se vuelve a resolver con el estado nuevo
+            continue
+    return None
+
+def raise_bid_rejected(auction_id):
+    auction = Auction.objects.filter(pk=auction_id).values("closing_date", "current_bid").first()
+    if auction is None:
+        raise NotFound("The auction does not exist.")
+    if auction["closing_date"] <= timezone.now():
+        raise ValidationError({"auction": ["The auction has already closed. No more bids are allowed."]})
+    raise ValidationError({"price": [
+        f"The new bid price must be higher than the previous winning bid ({auction['current_bid']})."
+    ]})
+
+def refresh_bid_state(auction_id):
+    """
+    Recalcula el estado de pujas de la subasta tras editar o borrar una puja.
+    Se llama dentro de una transacción que ya tiene la subasta bloqueada
+    (lock_auctions) desde antes de escribir la puja; si no, una puja
+    simultánea podría perderse al escribir los valores absolutos.
+    """
+    bids = Bid.objects.filter(auction=auction_id)
+    state = bids.aggregate(highest=Max("price"), count=Count("id"), last=Max("creation_date"))
+    Auction.objects.filter(pk=auction_id).update(
+        current_bid=state["highest"], bid_count=state["count"], last_bid_at=state["last"],
+    )
+    touch_auction(auction_id)
+    broker.publish_on_commit(auction_id, "price", {"current_bid": state["highest"], "bid_count": state["count"]})
+
+
+# Cierre de subastas. El programador (manage.py close_auctions) marca como
+# cerradas las subastas vencidas y guarda su resultado, de modo que leer una
+# subasta cerrada no obliga a recorrer sus pujas, y emite el evento "closed".
+def close_due_auctions(now=None, batch_size=500):
+    """Cierra por lotes las subastas con closing_date <= now. Devuelve cuántas ha cerrado."""
+    now = now or timezone.now()
+    winning = Bid.objects.filter(auction=OuterRef("pk")).order_by("-price", "id")
+    closed = 0
+    while True:
+        with transaction.atomic():
+            due = list(
+                Auction.objects.select_for_update(skip_locked=True)
+                .filter(is_closed=False, closing_date__lte=now)
+                .order_by("closing_date")
+                .annotate(
+                    winning_bid_id=Subquery(winning.values("id")[:1]),
+                    winner=Subquery(winning.values("bidder")[:1]),
+                    final_price=Subquery(winning.values("price")[:1]),
+                )
+                .values("id", "winning_bid_id", "winner", "final_price")[:batch_size]
+            )
+            if not due:
+                return closed
+            AuctionResult.objects.bulk_create([AuctionResult(auction_id=row["id"], winning_bid_id=row["winning_bid_id"],
+                                                             winner=row["winner"], final_price=row["final_price"])
+                                               for row in due], ignore_conflicts=True)
+            Auction.objects.filter(pk__in=[row["id"] for row in due]).update(is_closed=True)
+            for row in due:
+                touch_auction(row["id"])
+                broker.publish_on_commit(row["id"], "closed", {"winner": row["winner"], "final_price": row["final_price"]})
+            touch_listing()
+        closed += len(due)
+        if len(due) < batch_size:
+            return closed
+
+def next_closing_date():
+    """Fecha del próximo cierre pendiente, o None si no queda ninguna subasta abierta."""
+    return Auction.objects.filter(is_closed=False).aggregate(next_closing=Min("closing_date"))["next_closing"]
+
+def reopen_auction(auction):
+    """Deshace el cierre si se ha ampliado la fecha de una subasta ya cerrada."""
+    AuctionResult.objects.filter(auction=auction).delete()
+    Auction.objects.filter(pk=auction.pk).update(is_closed=False)
+    auction.is_closed = False
+    auction._state.fields_cache.pop("result", None)
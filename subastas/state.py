@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from django.conf import settings
+from django.utils import timezone
+from .models import Auction
+
+# Estado de una subasta para validar pujas y comentarios (si sigue abierta y
+# cuál es la puja más alta) sin serializarla entera. Se guarda en la petición
+# (memo) y en una caché LRU del proceso con un TTL corto y como mucho
+# AUCTION_STATE_CACHE_SIZE subastas. La caché del proceso se invalida al
+# confirmar cualquier escritura de la subasta (touch_auction); en otros
+# procesos caduca con el TTL. La decisión final sobre una puja sigue siendo de
+# place_bid, así que un estado de hace un segundo solo puede adelantar o
+# retrasar un rechazo.
+
+
+@dataclass(frozen=True)
+class AuctionState:
+    closing_date: datetime
+    current_bid: Decimal | None
+    is_closed: bool
+
+    @property
+    def is_open(self):
+        return not self.is_closed and self.closing_date > timezone.now()
+
+
+_lock = threading.Lock()
+_states = OrderedDict()
+
+
+def get_auction_state(auction_id, request=None):
+    """Estado de la subasta o None si no existe."""
+    memo = getattr(request, "_auction_states", None) if request is not None else None
+    if memo is not None and auction_id in memo:
+        return memo[auction_id]
+
+    now = time.monotonic()
+    with _lock:
+        entry = _states.get(auction_id)
+        if entry is not None:
+            if entry[0] > now:
+                _states.move_to_end(auction_id)
+            else:
+                del _states[auction_id]
+                entry = None
+    if entry is not None:
+        state = entry[1]
+    else:
+        row = Auction.objects.filter(pk=auction_id).values("closing_date", "current_bid", "is_closed").first()
+        state = AuctionState(**row) if row is not None else None
+        if state is not None:
+            with _lock:
+                _states[auction_id] = (now + getattr(settings, "AUCTION_STATE_TTL", 2), state)
+                _states.move_to_end(auction_id)
+                while len(_states) > getattr(settings, "AUCTION_STATE_CACHE_SIZE", 1024):
+                    _states.popitem(last=False)
+
+    if request is not None:
+        if memo is None:
+            memo = request._auction_states = {}
+        memo[auction_id] = state
+    return state
+
+
+def forget_auction_state(auction_id):
+    with _lock:
+        _states.pop(auction_id, None)
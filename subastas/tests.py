@@ -1,3 +1,682 @@
-from django.test import TestCase
+import io
+import json
+import re
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Max
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.test import APIClient
+from usuarios.models import CustomUser
+from .models import Category, Auction, Bid, ProxyBid, Rating, Comment
+from .caching import auction_version_key, renew_versions
+from .events import broker
+from .search import search_auctions
+from .sequencer import AuctionSequencer, bid_sequencer
+from .state import _states, get_auction_state
+from .importer import AuctionImport, read_rows
+from .pagination import KeysetPagination
+from .registry import category_registry
+from .services import place_bid, rebuild_comment_counts, rebuild_rating_aggregates, resolve_proxy_bids, upsert_ratings
 
 # Create your tests here.
+
+class QueryPlanTests(TestCase):
+    """
+    Comprueba con EXPLAIN que las consultas más frecuentes de views.py y
+    serializers.py usan un índice y no recorren la tabla entera.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.users = CustomUser.objects.bulk_create(
+            CustomUser(username=f"user{i}", birth_date="1990-01-01") for i in range(20)
+        )
+        cls.categories = Category.objects.bulk_create(Category(name=f"categoria{i}") for i in range(10))
+        Auction.objects.bulk_create(
+            Auction(title=f"Subasta {i}", description="descripcion", thumbnail="https://example.com/a.png",
+                    closing_date=now + timedelta(days=i % 40 - 20), price=Decimal(i % 500), stock=1,
+                    category=cls.categories[i % 10], brand="marca", auctioneer=cls.users[i % 20])
+            for i in range(1000)
+        )
+        # Como si el programador de cierres ya hubiera pasado
+        Auction.objects.filter(closing_date__lte=now).update(is_closed=True)
+        auctions = list(Auction.objects.all())
+        Bid.objects.bulk_create(
+            Bid(auction=auctions[i % 1000], price=Decimal(i), bidder=f"user{i % 20}", user=cls.users[i % 20])
+            for i in range(3000)
+        )
+        Comment.objects.bulk_create(
+            Comment(title="titulo", content="contenido", author=cls.users[i % 20], auction=auctions[i % 1000])
+            for i in range(2000)
+        )
+        Rating.objects.bulk_create(
+            Rating(rating=i % 5 + 1, reviewer=cls.users[i % 20], auction=auctions[i // 20]) for i in range(2000)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        cls.auction = auctions[0]
+        cls.user = cls.users[0]
+
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            # Con pocas filas el planificador prefiere un Seq Scan aunque haya índice
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == "postgresql":
+            self.assertNotIn("Seq Scan", plan, plan)
+        elif connection.vendor == "sqlite":
+            table = queryset.model._meta.db_table
+            self.assertIsNone(re.search(rf"\bSCAN {table}\b", plan), plan)
+
+    def test_auction_category_price_filter(self):
+        self.assertUsesIndex(Auction.objects.filter(
+            category_id=self.categories[3].id, price__gte=10, price__lte=200
+        ))
+
+    def test_auction_closing_date_filter(self):
+        self.assertUsesIndex(Auction.objects.filter(closing_date__gt=timezone.now()).order_by("closing_date"))
+
+    def test_open_auctions_filter(self):
+        self.assertUsesIndex(Auction.objects.open().filter(auctioneer=self.user))
+
+    def test_text_search(self):
+        # Con filtro de categoría y precio el MATCH tiene que hacerse una sola
+        # vez, no una por subasta (ni para filtrar ni para bm25)
+        filtered = Auction.objects.filter(category_id=self.categories[3].id, price__gte=10)
+        queryset = search_auctions(filtered, "subasta")
+        self.assertEqual(queryset.count(), filtered.count())
+        plan = queryset.explain()
+        if connection.vendor == "postgresql":
+            self.assertIn("subastas_auction_search_idx", plan, plan)
+        elif connection.vendor == "sqlite":
+            self.assertEqual(plan.count("VIRTUAL TABLE"), 1, plan)
+            self.assertIn("SEARCH subastas_auction USING INTEGER PRIMARY KEY", plan, plan)
+            self.assertNotIn("CORRELATED", plan, plan)
+
+    def test_due_auctions(self):
+        self.assertUsesIndex(Auction.objects.filter(is_closed=False, closing_date__lte=timezone.now()).order_by("closing_date"))
+
+    def test_bids_by_auction_sorted_by_price(self):
+        self.assertUsesIndex(Bid.objects.filter(auction=self.auction.id).order_by("-price"))
+
+    def test_highest_bid(self):
+        self.assertUsesIndex(Bid.objects.filter(auction=self.auction.id).order_by("-price")[:1])
+
+    def test_bids_by_user_grouped_by_auction(self):
+        self.assertUsesIndex(Bid.objects.filter(user=self.user).values("auction").annotate(Max("price")))
+
+    def test_top_proxy_bids(self):
+        self.assertUsesIndex(ProxyBid.objects.filter(auction=self.auction.id).order_by("-max_price", "creation_date")[:2])
+
+    def test_comments_by_auction(self):
+        self.assertUsesIndex(Comment.objects.filter(auction_id=self.auction.id))
+
+    def test_recent_comments_by_auction(self):
+        self.assertUsesIndex(Comment.objects.filter(auction_id=self.auction.id).order_by("-creation_date", "-id"))
+
+    def test_comment_feed(self):
+        # Es un recorrido completo en el orden del índice, cortado por el LIMIT: lo
+        # que importa es que no haya que ordenar la tabla
+        plan = Comment.objects.order_by("auction_id", "-creation_date", "-id")[:20].explain()
+        if connection.vendor == "postgresql":
+            self.assertIn("comment_auction_recent_idx", plan, plan)
+            self.assertNotIn("Sort", plan, plan)
+        elif connection.vendor == "sqlite":
+            self.assertIn("comment_auction_recent_idx", plan, plan)
+            self.assertNotIn("TEMP B-TREE", plan, plan)
+
+    def test_rating_by_auction_and_reviewer(self):
+        self.assertUsesIndex(Rating.objects.filter(auction_id=self.auction.id, reviewer=self.user))
+
+    def test_ratings_by_reviewer(self):
+        self.assertUsesIndex(Rating.objects.filter(reviewer=self.user))
+
+
+class AuctionListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username="vendedor", birth_date="1990-01-01")
+        category = Category.objects.create(name="Moviles")
+        Auction.objects.bulk_create(
+            Auction(title=f"Subasta {i}", description="descripcion", thumbnail="https://example.com/a.png",
+                    closing_date=timezone.now() + timedelta(days=5), price=Decimal(i), stock=1,
+                    category=category, brand="marca", auctioneer=cls.user)
+            for i in range(3)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_sparse_fields_keep_id(self):
+        # Petición anónima: pasa por la caché de respuestas, que necesita el id de cada fila
+        response = self.client.get("/api/subastas/", {"fields": "title"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([set(row) for row in response.json()["results"]], [{"id", "title"}] * 3)
+
+    def test_write_during_listing_is_not_cached_as_current(self):
+        target = Auction.objects.order_by("pk").first()
+        paginate = KeysetPagination.paginate_queryset
+
+        def paginate_then_bid(paginator, *args, **kwargs):
+            # Una puja confirmada justo después de leer la página
+            page = paginate(paginator, *args, **kwargs)
+            Auction.objects.filter(pk=target.pk).update(current_bid=Decimal("9.00"))
+            renew_versions([auction_version_key(target.pk)])
+            return page
+
+        with mock.patch.object(KeysetPagination, "paginate_queryset", paginate_then_bid):
+            self.client.get("/api/subastas/")
+        rows = {row["id"]: row for row in self.client.get("/api/subastas/").json()["results"]}
+        self.assertEqual(rows[target.pk]["current_bid"], "9.00")
+
+    def test_category_deletion_invalidates_cached_auctions(self):
+        auction = Auction.objects.order_by("pk").first()
+        self.assertEqual(len(self.client.get("/api/subastas/").json()["results"]), 3)
+        self.assertEqual(self.client.get(f"/api/subastas/{auction.pk}/").status_code, 200)
+        admin = APIClient()
+        admin.force_authenticate(CustomUser.objects.create_superuser(
+            username="admin", password="secreta", birth_date="1990-01-01"))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = admin.delete(f"/api/subastas/categorias/{auction.category_id}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get("/api/subastas/").json()["results"], [])
+        self.assertEqual(self.client.get(f"/api/subastas/{auction.pk}/").status_code, 404)
+
+    def test_seller_deletion_invalidates_cached_auctions(self):
+        self.assertEqual(len(self.client.get("/api/subastas/").json()["results"]), 3)
+        admin = APIClient()
+        admin.force_authenticate(CustomUser.objects.create_superuser(
+            username="admin", password="secreta", birth_date="1990-01-01"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(admin.delete(f"/api/usuarios/{self.user.pk}/").status_code, 204)
+        self.assertEqual(self.client.get("/api/subastas/").json()["results"], [])
+
+
+class AuctionImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username="vendedor", birth_date="1990-01-01")
+        cls.other = CustomUser.objects.create_user(username="otro", birth_date="1990-01-01")
+        Category.objects.create(name="Moviles")
+
+    def setUp(self):
+        category_registry.invalidate()
+
+    def row(self, **extra):
+        closing_date = (timezone.now() + timedelta(days=20)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        return {"title": "Telefono", "description": "Telefono libre", "closing_date": closing_date,
+                "thumbnail": "https://example.com/a.png", "price": "10.00", "stock": 1, "category": "Moviles",
+                "brand": "marca", **extra}
+
+    def test_auctioneer_column_is_ignored(self):
+        stream = io.BytesIO(json.dumps(self.row(auctioneer=self.other.id)).encode() + b"\n")
+        report = AuctionImport(self.user).run(read_rows(stream, "ndjson"))
+        self.assertEqual((report["created"], report["failed"]), (1, 0), report)
+        self.assertEqual(Auction.objects.get().auctioneer, self.user)
+
+    def test_rows_that_are_not_utf8_are_rejected(self):
+        header = ",".join(self.row())
+        good = ",".join(str(value) for value in self.row().values())
+        bad = ",".join(str(value) for value in self.row(title="Teléfono").values())
+        stream = io.BytesIO(f"{header}\n{good}\n".encode() + f"{bad}\n".encode("latin-1"))
+        report = AuctionImport(self.user).run(read_rows(stream, "csv"))
+        self.assertEqual((report["created"], report["failed"]), (1, 1), report)
+        self.assertEqual(report["errors"][0]["row"], 2)
+
+
+class BidTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = CustomUser.objects.create_user(username="vendedor", birth_date="1990-01-01")
+        cls.bidder = CustomUser.objects.create_user(username="pujador", birth_date="1990-01-01")
+        cls.category = Category.objects.create(name="Moviles")
+
+    def setUp(self):
+        self.auction = Auction.objects.create(
+            title="Telefono", description="Telefono libre", thumbnail="https://example.com/a.png",
+            closing_date=timezone.now() + timedelta(days=5), price=Decimal("1.00"), stock=1,
+            category=self.category, brand="marca", auctioneer=self.seller,
+        )
+
+    def assertBidState(self, current_bid, bid_count):
+        self.auction.refresh_from_db()
+        self.assertEqual((self.auction.current_bid, self.auction.bid_count), (current_bid, bid_count))
+        self.assertEqual(Bid.objects.filter(auction=self.auction).count(), bid_count)
+
+    def test_higher_bid_is_accepted(self):
+        place_bid(self.auction.id, Decimal("5.00"), "pujador", self.bidder)
+        bid = place_bid(self.auction.id, Decimal("6.00"), "pujador", self.bidder)
+        self.assertEqual(bid.price, Decimal("6.00"))
+        self.assertBidState(Decimal("6.00"), 2)
+
+    def test_bid_not_above_current_is_rejected(self):
+        place_bid(self.auction.id, Decimal("5.00"), "pujador", self.bidder)
+        for price in ("5.00", "4.00"):
+            with self.assertRaises(ValidationError) as raised:
+                place_bid(self.auction.id, Decimal(price), "pujador", self.bidder)
+            self.assertIn("price", raised.exception.detail)
+        self.assertBidState(Decimal("5.00"), 1)
+
+    def test_stale_validation_loses_the_race(self):
+        # Dos pujas validadas contra la misma puja más alta: la condición del
+        # UPDATE deja pasar solo la que sigue superando a la guardada
+        place_bid(self.auction.id, Decimal("7.00"), "otro", None)
+        with self.assertRaises(ValidationError):
+            place_bid(self.auction.id, Decimal("6.00"), "pujador", self.bidder)
+        self.assertBidState(Decimal("7.00"), 1)
+
+    def test_closed_auction_rejects_bids(self):
+        Auction.objects.filter(pk=self.auction.pk).update(closing_date=timezone.now() - timedelta(minutes=1))
+        with self.assertRaises(ValidationError) as raised:
+            place_bid(self.auction.id, Decimal("5.00"), "pujador", self.bidder)
+        self.assertIn("auction", raised.exception.detail)
+        self.assertBidState(None, 0)
+
+    def test_missing_auction(self):
+        with self.assertRaises(NotFound):
+            place_bid(self.auction.id + 1, Decimal("5.00"), "pujador", self.bidder)
+
+    def test_bids_survive_user_deletion(self):
+        place_bid(self.auction.id, Decimal("5.00"), self.bidder.username, self.bidder)
+        self.bidder.delete()
+        bid = Bid.objects.get(auction=self.auction)
+        self.assertIsNone(bid.user)
+        self.assertEqual(bid.bidder, "pujador")
+
+    def test_event_backend_failure_keeps_the_bid(self):
+        with mock.patch.object(broker.backend, "publish", side_effect=ConnectionError("redis down")), \
+                self.assertLogs("subastas.events", "ERROR"), self.captureOnCommitCallbacks(execute=True):
+            place_bid(self.auction.id, Decimal("5.00"), "pujador", self.bidder)
+        self.assertBidState(Decimal("5.00"), 1)
+
+    @override_settings(AUCTION_BID_SEQUENCER=True)
+    def test_sequencer_timeout_drops_the_bid(self):
+        Auction.objects.filter(pk=self.auction.pk).update(closing_date=timezone.now() + timedelta(minutes=5))
+        client = APIClient()
+        client.force_authenticate(self.bidder)
+        # Un secuenciador que no llega a atender la cola a tiempo
+        with mock.patch.object(AuctionSequencer, "run"), mock.patch("subastas.sequencer.RESULT_TIMEOUT", 0.01):
+            response = client.post(f"/api/subastas/{self.auction.id}/pujas/",
+                                   {"price": "5.00", "bidder": "pujador", "auction": self.auction.id}, format="json")
+        self.assertEqual(response.status_code, 503, response.data)
+        sequencer = bid_sequencer._sequencers.pop(self.auction.id)
+        sequencer.process([sequencer.queue.get_nowait()])
+        self.assertBidState(None, 0)
+
+    @override_settings(AUCTION_STATE_CACHE_SIZE=2)
+    def test_process_state_cache_is_bounded(self):
+        _states.clear()
+        auctions = [self.auction] + [
+            Auction.objects.create(
+                title=f"Telefono {i}", description="Telefono libre", thumbnail="https://example.com/a.png",
+                closing_date=timezone.now() + timedelta(days=5), price=Decimal("1.00"), stock=1,
+                category=self.category, brand="marca", auctioneer=self.seller,
+            ) for i in range(2)
+        ]
+        for auction in auctions:
+            self.assertTrue(get_auction_state(auction.id).is_open)
+        # Se descarta la menos usada
+        self.assertEqual(list(_states), [auctions[1].id, auctions[2].id])
+
+    def test_history_uses_the_api_date_format(self):
+        place_bid(self.auction.id, Decimal("5.00"), "pujador", self.bidder)
+        bids = self.client.get(f"/api/subastas/{self.auction.id}/pujas/").json()["results"]
+        history = self.client.get(f"/api/subastas/{self.auction.id}/historial/", {"intervalo": 1}).json()
+        self.assertEqual(history["buckets"][0]["start"], bids[0]["creation_date"])
+
+    def test_bid_update_cannot_move_auction(self):
+        other = Auction.objects.create(
+            title="Tablet", description="Tablet libre", thumbnail="https://example.com/b.png",
+            closing_date=timezone.now() + timedelta(days=5), price=Decimal("1.00"), stock=1,
+            category=self.category, brand="marca", auctioneer=self.seller,
+        )
+        bid = place_bid(self.auction.id, Decimal("5.00"), "pujador", self.bidder)
+        client = APIClient()
+        client.force_authenticate(self.bidder)
+        response = client.patch(f"/api/subastas/{self.auction.id}/pujas/{bid.id}/",
+                                {"price": "8.00", "auction": other.id}, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["auction"], self.auction.id)
+        self.assertBidState(Decimal("8.00"), 1)
+        other.refresh_from_db()
+        self.assertEqual((other.current_bid, other.bid_count), (None, 0))
+
+        response = client.delete(f"/api/subastas/{self.auction.id}/pujas/{bid.id}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertBidState(None, 0)
+
+
+class ProxyBidTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = CustomUser.objects.create_user(username="vendedor", birth_date="1990-01-01")
+        cls.ana = CustomUser.objects.create_user(username="ana", birth_date="1990-01-01")
+        cls.luis = CustomUser.objects.create_user(username="luis", birth_date="1990-01-01")
+        cls.category = Category.objects.create(name="Moviles")
+
+    def setUp(self):
+        _states.clear()
+        self.auction = Auction.objects.create(
+            title="Telefono", description="Telefono libre", thumbnail="https://example.com/a.png",
+            closing_date=timezone.now() + timedelta(days=5), price=Decimal("10.00"), stock=1,
+            category=self.category, brand="marca", auctioneer=self.seller,
+        )
+
+    def put_proxy(self, user, max_price):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.put(f"/api/subastas/{self.auction.id}/puja-maxima/", {"max_price": max_price}, format="json")
+
+    def assertLeader(self, price, bidder):
+        leader = Bid.objects.filter(auction=self.auction).order_by("-price", "id").first()
+        self.assertEqual((leader.price, leader.bidder), (Decimal(price), bidder))
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.current_bid, Decimal(price))
+
+    def test_first_bid_is_the_start_price(self):
+        response = self.put_proxy(self.ana, "50.00")
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertLeader("10.00", "ana")
+        self.assertEqual(Bid.objects.filter(auction=self.auction).count(), 1)
+
+    def test_leader_outbids_runner_up_by_increment(self):
+        self.assertEqual(self.put_proxy(self.ana, "50.00").status_code, 201)
+        self.assertEqual(self.put_proxy(self.luis, "30.00").status_code, 201)
+        self.assertLeader("31.00", "ana")
+        # Subir la propia puja máxima no hace pujar contra uno mismo
+        self.assertEqual(self.put_proxy(self.ana, "80.00").status_code, 200)
+        self.assertLeader("31.00", "ana")
+
+    def test_bid_is_capped_at_max_price(self):
+        self.assertEqual(self.put_proxy(self.ana, "50.00").status_code, 201)
+        place_bid(self.auction.id, Decimal("49.50"), "otro", None)
+        resolve_proxy_bids(self.auction.id)
+        self.assertLeader("50.00", "ana")
+        place_bid(self.auction.id, Decimal("55.00"), "otro", None)
+        self.assertIsNone(resolve_proxy_bids(self.auction.id))
+        self.assertLeader("55.00", "otro")
+
+    def test_tie_goes_to_the_earliest_proxy(self):
+        now = timezone.now()
+        ProxyBid.objects.create(auction=self.auction, user=self.luis, max_price=Decimal("40.00"))
+        ProxyBid.objects.create(auction=self.auction, user=self.ana, max_price=Decimal("40.00"))
+        ProxyBid.objects.filter(user=self.ana).update(creation_date=now - timedelta(minutes=1))
+        ProxyBid.objects.filter(user=self.luis).update(creation_date=now)
+        resolve_proxy_bids(self.auction.id)
+        self.assertLeader("40.00", "ana")
+
+    def test_retries_when_a_concurrent_bid_gets_in_first(self):
+        ProxyBid.objects.create(auction=self.auction, user=self.ana, max_price=Decimal("50.00"))
+        attempts = []
+
+        def concurrent_bid_first(auction_id, price, bidder, user=None):
+            if not attempts:
+                # Otra petición puja entre la lectura del estado y la puja automática
+                place_bid(auction_id, Decimal("20.00"), "otro", None)
+            attempts.append(price)
+            return place_bid(auction_id, price, bidder, user)
+
+        with mock.patch("subastas.services.place_bid", side_effect=concurrent_bid_first):
+            bid = resolve_proxy_bids(self.auction.id)
+        self.assertEqual(attempts, [Decimal("10.00"), Decimal("21.00")])
+        self.assertEqual(bid.price, Decimal("21.00"))
+        self.assertLeader("21.00", "ana")
+
+
+class AuctionBatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = CustomUser.objects.create_user(username="vendedor", birth_date="1990-01-01")
+        cls.other = CustomUser.objects.create_user(username="otro", birth_date="1990-01-01")
+        category = Category.objects.create(name="Moviles")
+        cls.auctions = Auction.objects.bulk_create(
+            Auction(title=f"Subasta {i}", description="descripcion", thumbnail="https://example.com/a.png",
+                    closing_date=timezone.now() + timedelta(days=5), price=Decimal("10.00"), stock=1,
+                    category=category, brand="marca", auctioneer=cls.seller)
+            for i in range(3)
+        )
+
+    def setUp(self):
+        _states.clear()
+
+    def batch(self, user, operations, atomic=False):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client.post("/api/subastas/lote/", {"atomico": atomic, "operaciones": operations}, format="json")
+
+    def test_atomic_batch_rolls_back(self):
+        first, second = self.auctions[:2]
+        response = self.batch(self.seller, [
+            {"op": "patch", "id": first.id, "datos": {"price": "20.00"}},
+            {"op": "get", "id": 0},
+            {"op": "patch", "id": second.id, "datos": {"price": "30.00"}},
+        ], atomic=True)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual([result["status"] for result in response.data["resultados"]], [200, 404, 424])
+        self.assertEqual(list(Auction.objects.filter(pk__in=[first.id, second.id]).values_list("price", flat=True)),
+                         [Decimal("10.00")] * 2)
+
+    def test_each_operation_checks_its_permissions(self):
+        auction = self.auctions[0]
+        operations = [{"op": "get", "id": auction.id}, {"op": "patch", "id": auction.id, "datos": {"price": "20.00"}}]
+        statuses = {}
+        for name, user in (("anonimo", None), ("otro", self.other), ("vendedor", self.seller)):
+            response = self.batch(user, operations)
+            self.assertEqual(response.status_code, 200)
+            statuses[name] = [result["status"] for result in response.data["resultados"]]
+        self.assertEqual(statuses, {"anonimo": [200, 401], "otro": [200, 403], "vendedor": [200, 200]})
+        auction.refresh_from_db()
+        self.assertEqual(auction.price, Decimal("20.00"))
+
+    def test_auctions_and_ratings_are_read_once(self):
+        upsert_ratings([(self.other.id, self.auctions[0].id, 4), (self.other.id, self.auctions[2].id, 2)])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.batch(self.other, [{"op": "get", "id": auction.id} for auction in self.auctions])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result["data"]["user_rating"] for result in response.data["resultados"]], [4, None, 2])
+        selects = [q["sql"] for q in queries.captured_queries if q["sql"].startswith("SELECT")]
+        self.assertEqual(len([sql for sql in selects if 'FROM "subastas_auction"' in sql]), 1, selects)
+        self.assertEqual(len([sql for sql in selects if 'FROM "subastas_rating"' in sql]), 1, selects)
+
+
+class CategoryRegistryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category_registry.invalidate()
+        self.category = Category.objects.create(name="Moviles")
+
+    def rename_in_other_worker(self):
+        # Otro proceso con LocMemCache: escribe sin que este vea su sello
+        Category.objects.filter(pk=self.category.pk).update(name="Telefonos")
+
+    def test_local_cache_reloads_after_ttl(self):
+        with self.settings(CATEGORY_REGISTRY_TTL=0):
+            self.assertEqual(category_registry.get_id("Moviles"), self.category.pk)
+            self.rename_in_other_worker()
+            self.assertIsNone(category_registry.get_id("Moviles"))
+            self.assertEqual(category_registry.all(), [{"id": self.category.pk, "name": "Telefonos"}])
+
+    def test_write_invalidates(self):
+        self.assertEqual(category_registry.get_name(self.category.pk), "Moviles")
+        admin = CustomUser.objects.create_superuser(username="admin", password="secreta", birth_date="1990-01-01")
+        client = APIClient()
+        client.force_authenticate(admin)
+        with self.settings(CATEGORY_REGISTRY_TTL=60), self.captureOnCommitCallbacks(execute=True):
+            response = client.patch(f"/api/subastas/categorias/{self.category.pk}/", {"name": "Telefonos"},
+                                    format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(category_registry.get_name(self.category.pk), "Telefonos")
+
+
+class RatingAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = CustomUser.objects.bulk_create(
+            CustomUser(username=f"user{i}", birth_date="1990-01-01") for i in range(3)
+        )
+        category = Category.objects.create(name="Moviles")
+        cls.auctions = Auction.objects.bulk_create(
+            Auction(title=f"Subasta {i}", description="descripcion", thumbnail="https://example.com/a.png",
+                    closing_date=timezone.now() + timedelta(days=5), price=Decimal("1.00"), stock=1,
+                    category=category, brand="marca", auctioneer=cls.users[0])
+            for i in range(2)
+        )
+
+    def aggregates(self):
+        fields = ["rating_sum", "rating_count", "rating_1", "rating_2", "rating_3", "rating_4", "rating_5"]
+        return list(Auction.objects.order_by("pk").values_list(*fields))
+
+    def test_upsert_applies_deltas(self):
+        first, second = self.auctions
+        upsert_ratings([(self.users[0].id, first.id, 5), (self.users[1].id, first.id, 3)])
+        # Cambia una, repite otra con el mismo valor y añade una nueva
+        with CaptureQueriesContext(connection) as queries:
+            upsert_ratings([(self.users[0].id, first.id, 2), (self.users[1].id, first.id, 3),
+                            (self.users[2].id, second.id, 4)])
+        self.assertEqual(self.aggregates(), [(5, 2, 0, 1, 1, 0, 0), (4, 1, 0, 0, 0, 1, 0)])
+        # Ninguna subconsulta por subasta: bloqueo, lectura, upsert y un UPDATE por subasta
+        statements = [q["sql"] for q in queries.captured_queries if "SAVEPOINT" not in q["sql"]]
+        self.assertEqual(len(statements), 5, statements)
+
+        rebuilt = self.aggregates()
+        rebuild_rating_aggregates()
+        self.assertEqual(self.aggregates(), rebuilt)
+
+    def test_reviewer_deletion_discounts_ratings(self):
+        first, second = self.auctions
+        reviewer = CustomUser.objects.create_user(username="revisor", birth_date="1990-01-01")
+        upsert_ratings([(reviewer.id, first.id, 5), (reviewer.id, second.id, 2), (self.users[1].id, first.id, 3)])
+        admin = CustomUser.objects.create_superuser(username="admin", password="secreta", birth_date="1990-01-01")
+        client = APIClient()
+        client.force_authenticate(admin)
+        self.assertEqual(client.delete(f"/api/usuarios/{reviewer.pk}/").status_code, 204)
+        self.assertEqual(self.aggregates(), [(3, 1, 0, 0, 1, 0, 0), (0, 0, 0, 0, 0, 0, 0)])
+
+        rebuilt = self.aggregates()
+        rebuild_rating_aggregates()
+        self.assertEqual(self.aggregates(), rebuilt)
+
+
+class CommentCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = CustomUser.objects.create_user(username="vendedor", birth_date="1990-01-01")
+        cls.admin = CustomUser.objects.create_superuser(username="admin", password="secreta", birth_date="1990-01-01")
+        cls.category = Category.objects.create(name="Moviles")
+
+    def setUp(self):
+        _states.clear()
+        self.auction = Auction.objects.create(
+            title="Telefono", description="Telefono libre", thumbnail="https://example.com/a.png",
+            closing_date=timezone.now() + timedelta(days=5), price=Decimal("1.00"), stock=1,
+            category=self.category, brand="marca", auctioneer=self.seller,
+        )
+
+    def comment_as(self, user, count=1):
+        client = APIClient()
+        client.force_authenticate(user)
+        for _ in range(count):
+            response = client.post(f"/api/subastas/{self.auction.id}/comentarios/",
+                                   {"title": "Pregunta", "content": "¿Tiene garantia?"}, format="json")
+            self.assertEqual(response.status_code, 201, response.data)
+        return client
+
+    def assertCommentCount(self, count):
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.comment_count, count)
+        self.assertEqual(Comment.objects.filter(auction=self.auction).count(), count)
+
+    def test_user_deletion_discounts_comments(self):
+        author = CustomUser.objects.create_user(username="autor", birth_date="1990-01-01")
+        other = CustomUser.objects.create_user(username="otro", birth_date="1990-01-01")
+        self.comment_as(author, 2)
+        client = self.comment_as(other)
+        self.assertCommentCount(3)
+
+        admin = APIClient()
+        admin.force_authenticate(self.admin)
+        self.assertEqual(admin.delete(f"/api/usuarios/{author.pk}/").status_code, 204)
+        self.assertCommentCount(1)
+        self.assertEqual(client.delete("/api/usuarios/perfil/").status_code, 204)
+        self.assertCommentCount(0)
+
+    def test_closed_or_missing_auction_rejects_comments(self):
+        client = APIClient()
+        client.force_authenticate(self.seller)
+        data = {"title": "Pregunta", "content": "¿Tiene garantia?"}
+        Auction.objects.filter(pk=self.auction.pk).update(closing_date=timezone.now() - timedelta(minutes=1))
+        response = client.post(f"/api/subastas/{self.auction.id}/comentarios/", data, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("auction", response.data)
+        response = client.post(f"/api/subastas/{self.auction.id + 1}/comentarios/", data, format="json")
+        self.assertEqual(response.status_code, 404)
+        self.assertCommentCount(0)
+
+    def test_rebuild_comment_counts(self):
+        self.comment_as(self.seller, 2)
+        Auction.objects.filter(pk=self.auction.pk).update(comment_count=7)
+        self.assertEqual(rebuild_comment_counts(), 1)
+        self.assertCommentCount(2)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username="vendedor", birth_date="1990-01-01")
+        category = Category.objects.create(name="Moviles")
+        # Precios repetidos para que el desempate por id importe
+        cls.auctions = Auction.objects.bulk_create(
+            Auction(title=f"Subasta {i}", description="descripcion", thumbnail="https://example.com/a.png",
+                    closing_date=timezone.now() + timedelta(days=5), price=Decimal(i // 2), stock=1,
+                    category=category, brand="marca", auctioneer=cls.user)
+            for i in range(7)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertNotIn("count", response.data)
+            pages.append(response.data)
+            url = response.data["next"]
+        return pages
+
+    def ids(self, page):
+        return [row["id"] for row in page["results"]]
+
+    def test_next_cursors_cover_every_row_once(self):
+        for orden, expected in (("id", sorted(a.id for a in self.auctions)),
+                                ("-precio", [a.id for a in sorted(self.auctions, key=lambda a: (-a.price, -a.id))])):
+            pages = self.walk(f"/api/subastas/?cursor=&orden={orden}&page_size=2")
+            self.assertEqual([len(page["results"]) for page in pages], [2, 2, 2, 1])
+            self.assertEqual([pk for page in pages for pk in self.ids(page)], expected)
+            self.assertIsNone(pages[0]["previous"])
+
+    def test_previous_cursor_returns_the_page_before(self):
+        pages = self.walk("/api/subastas/?cursor=&orden=precio&page_size=2")
+        for before, page in zip(pages, pages[1:]):
+            response = self.client.get(page["previous"])
+            self.assertEqual(self.ids(response.data), self.ids(before))
+        first = self.client.get(pages[1]["previous"]).data
+        self.assertIsNone(first["previous"])
+        self.assertIsNotNone(first["next"])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get("/api/subastas/?cursor=no-es-un-cursor").status_code, 404)
+        self.assertEqual(self.client.get("/api/subastas/?cursor=&orden=nombre").status_code, 400)
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import CategoryList, CategoryCreate, CategoryRetrieveUpdateDestroy, AuctionListCreate, AuctionRetrieveUpdateDestroy, BidListCreate, BidRetrieveUpdateDestroy, UserAuctionListView, UserBidListView, RatingList, RatingRetrieveUpdateDestroy, CommentListCreateView, CommentRetrieveUpdateDestroyView, UserCommentListView, CommentListView
+from .views import AuctionBatch, AuctionFacets, AuctionImportView, AuctionPriceHistory, AuctionRatingSummary, ProxyBidDetail, RatingBulkUpsert, CategoryList, CategoryCreate, CategoryRetrieveUpdateDestroy, AuctionListCreate, AuctionRetrieveUpdateDestroy, BidListCreate, BidRetrieveUpdateDestroy, UserAuctionListView, UserBidListView, RatingList, RatingRetrieveUpdateDestroy, CommentListCreateView, CommentRetrieveUpdateDestroyView, UserCommentListView, CommentListView
 
 app_name="auctions"
 urlpatterns = [
@@ -8,13 +8,20 @@ urlpatterns = [
     path('categorias/<int:id_category>/', CategoryRetrieveUpdateDestroy.as_view(), name='category-detail'),
 
     path('', AuctionListCreate.as_view(), name='auction-list-create'),
+    path('facetas/', AuctionFacets.as_view(), name='auction-facets'),
+    path('lote/', AuctionBatch.as_view(), name='auction-batch'),
+    path('importar/', AuctionImportView.as_view(), name='auction-import'),
     path('<int:pk>/', AuctionRetrieveUpdateDestroy.as_view(), name='auction-detail'),
     
     path('<int:id_auctions>/pujas/', BidListCreate.as_view(), name='bid-list-create'),
     path('<int:id_auctions>/pujas/<int:pk>/', BidRetrieveUpdateDestroy.as_view(), name='bid-detail'),
+    path('<int:id_auctions>/puja-maxima/', ProxyBidDetail.as_view(), name='proxy-bid-detail'),
+    path('<int:id_auctions>/historial/', AuctionPriceHistory.as_view(), name='auction-price-history'),
 
     path('mis-ratings/', RatingList.as_view(), name='rating-list-create'),
+    path('mis-ratings/lote/', RatingBulkUpsert.as_view(), name='rating-bulk-upsert'),
     path('mis-ratings/<int:id_auctions>/', RatingRetrieveUpdateDestroy.as_view(), name='rating-detail'),
+    path('<int:id_auctions>/valoraciones/', AuctionRatingSummary.as_view(), name='auction-rating-summary'),
 
     path('comentarios/', CommentListView.as_view(), name='comment-list-create'),
     path('<int:id_auctions>/comentarios/', CommentListCreateView.as_view(), name='comment-list-create'),
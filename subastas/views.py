@@ -1,13 +1,28 @@
+import copy
 from django.shortcuts import render
 from rest_framework import generics, status
-from rest_framework.exceptions import ValidationError, NotFound
-from .models import Category, Auction, Bid, Rating, Comment
-from .serializers import CategoryListCreateSerializer, CategoryDetailSerializer, AuctionListCreateSerializer, AuctionDetailSerializer, BidListCreateSerializer, BidDetailSerializer, RatingListCreateSerializer, RatingRetrieveSerializer, RatingUpdateDestroySerializer, CommentListCreateSerializer, CommentDetailSerializer
-from django.db.models import Q
+from rest_framework.exceptions import APIException, ValidationError, NotFound
+from .models import Category, Auction, Bid, ProxyBid, Rating, Comment
+from .serializers import requested_fields, CategoryListCreateSerializer, CategoryDetailSerializer, AuctionListCreateSerializer, AuctionDetailSerializer, BidListCreateSerializer, BidDetailSerializer, RatingListCreateSerializer, RatingRetrieveSerializer, RatingUpdateDestroySerializer, CommentListCreateSerializer, CommentDetailSerializer, UserBidSummarySerializer, ProxyBidSerializer, RatingSummarySerializer, RatingBulkSerializer
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.utils import timezone
+from django.db.models.functions import Floor
+from django.conf import settings
 from rest_framework.views import APIView 
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.response import Response
+from rest_framework.parsers import MultiPartParser
 from .permissions import IsOwnerOrAdmin, IsRegisteredUserOrAdmin, IsOwnerOrAdminAuction
+from . import services
+from .events import broker
+from .search import search_auctions
+from .history import price_history
+from .importer import FORMATS, AuctionImport, read_rows
+from .pagination import KeysetPagination
+from .registry import category_registry
+from .state import get_auction_state
+from .caching import CachedAuctionReadMixin, auction_version_key, touch_auction, touch_auctions, touch_listing, get_cache, get_versions, request_cache_key, LISTING_VERSION_KEY
 
 # Create your views here.
 # class CategoryListCreate(generics.ListCreateAPIView): SI NO NO PUEDO PONER EN LA WEB LAS CATEGORÍAS COMO NOMBRE PARA LOS USUARIOS
@@ -17,100 +32,350 @@ from .permissions import IsOwnerOrAdmin, IsRegisteredUserOrAdmin, IsOwnerOrAdmin
 
 class CategoryList(generics.ListAPIView):
     permission_classes = [AllowAny]
-    queryset = Category.objects.all()
     serializer_class = CategoryListCreateSerializer
 
+    def get_queryset(self):
+        # Se sirve desde el registro en memoria, sin consultar la base de datos
+        return category_registry.all()
+
 class CategoryCreate(generics.CreateAPIView):
     permission_classes = [IsAdminUser]
     queryset = Category.objects.all()
     serializer_class = CategoryListCreateSerializer
 
+    def perform_create(self, serializer):
+        serializer.save()
+        transaction.on_commit(category_registry.invalidate)
+
 class CategoryRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView): 
     permission_classes = [IsAdminUser] 
     queryset = Category.objects.all() 
     serializer_class = CategoryDetailSerializer 
+    lookup_url_kwarg = 'id_category'
 
+    def perform_update(self, serializer):
+        serializer.save()
+        transaction.on_commit(category_registry.invalidate)
 
-class AuctionListCreate(generics.ListCreateAPIView):
-    serializer_class = AuctionListCreateSerializer
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        # Sus subastas se borran en cascada
+        touch_auctions(list(instance.auctions.values_list("pk", flat=True)), listing=True)
+        instance.delete()
+        transaction.on_commit(category_registry.invalidate)
 
-    def get_queryset(self):
-        queryset = Auction.objects.all()
-        params = self.request.query_params
-        text = params.get("text", None)
-        category = params.get("categoria", None)
-        min_price = params.get("precioMin", None)
-        max_price = params.get("precioMax", None)
-
-        if text and len(text) < 3:
+
+def filter_open(queryset, params):
+    is_open = params.get("abiertas", None)
+    if is_open is None:
+        return queryset
+    if is_open not in ("true", "false"):
+        raise ValidationError(
+            {"abiertas": "Abiertas must be true or false."},
+            code=status.HTTP_400_BAD_REQUEST
+        )
+    return queryset.open() if is_open == "true" else queryset.closed()
+
+def filter_auctions(queryset, params, rank=True):
+    """
+    Aplica los filtros del listado de subastas (text, categoria, precioMin,
+    precioMax y abiertas). Con `rank=False` la búsqueda de texto no ordena por
+    relevancia.
+    """
+    text = params.get("text", None)
+    category = params.get("categoria", None)
+    min_price = params.get("precioMin", None)
+    max_price = params.get("precioMax", None)
+
+    queryset = filter_open(queryset, params)
+
+    if text and len(text) < 3:
+        raise ValidationError(
+            {"texto": "Texto query must be at least 3 characters long."},
+            code=status.HTTP_400_BAD_REQUEST
+        )
+    if text:
+        queryset = search_auctions(queryset, text, rank=rank)
+
+    if category:
+        category_id = category_registry.get_id(category)
+        if category_id is None:
             raise ValidationError(
-                {"texto": "Texto query must be at least 3 characters long."},
-                code=status.HTTP_400_BAD_REQUEST
+                {"categoria": "Categoria does not exist in the database."},
+                code=status.HTTP_404_NOT_FOUND
             )
-        if text:
-            queryset = queryset.filter(
-                Q(title__icontains=text) | 
-                Q(description__icontains=text)
+        queryset = queryset.filter(category_id=category_id)
+        
+    if min_price:
+        if int(min_price) < 0:
+            raise ValidationError(
+                {"precioMin": "PrecioMin must be positive, greater or equal than 0."},
+                code=status.HTTP_400_BAD_REQUEST
             )
-
-        if category:
-            try:
-                category_obj = Category.objects.get(name=category)
-                queryset = queryset.filter(category=category_obj)
-            except Category.DoesNotExist:
-                raise ValidationError(
-                    {"categoria": "Categoria does not exist in the database."},
-                    code=status.HTTP_404_NOT_FOUND
-                )
-            
-        if min_price:
-            if int(min_price) < 0:
-                raise ValidationError(
-                    {"precioMin": "PrecioMin must be positive, greater or equal than 0."},
-                    code=status.HTTP_400_BAD_REQUEST
-                )
-            queryset = queryset.filter(price__gte=min_price)
-        if max_price:
-            if int(max_price) < 0:
-                raise ValidationError(
-                    {"precioMax": "PrecioMax must be positive, greater or equal than 0."},
-                    code=status.HTTP_400_BAD_REQUEST
-                )
-            queryset = queryset.filter(price__lte=max_price)
-        if max_price and min_price and min_price >= max_price:
+        queryset = queryset.filter(price__gte=min_price)
+    if max_price:
+        if int(max_price) < 0:
             raise ValidationError(
-                {"precioMax": "PrecioMax must be greater than precioMin."},
+                {"precioMax": "PrecioMax must be positive, greater or equal than 0."},
                 code=status.HTTP_400_BAD_REQUEST
             )
-        
+        queryset = queryset.filter(price__lte=max_price)
+    if max_price and min_price and min_price >= max_price:
+        raise ValidationError(
+            {"precioMax": "PrecioMax must be greater than precioMin."},
+            code=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return queryset
+
+
+class AuctionListCreate(CachedAuctionReadMixin, generics.ListCreateAPIView):
+    serializer_class = AuctionListCreateSerializer
+    pagination_class = KeysetPagination
+    keyset_orderings = {"id": ("id",), "precio": ("price", "id"), "-precio": ("-price", "-id")}
+
+    compact_fields = ("id", "title", "thumbnail", "price", "closing_date", "current_bid", "comment_count")
+
+    def get_queryset(self):
+        queryset = filter_auctions(Auction.objects.with_is_open(), self.request.query_params)
+        fields = requested_fields(self.request)
+        if fields:
+            queryset = queryset.only(*AuctionListCreateSerializer.model_fields(fields))
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get("formato") != "compacto":
+            return super().list(request, *args, **kwargs)
+
+        # Formato compacto para las tarjetas: filas con .values(), sin serializador
+        queryset = self.get_queryset().values(*self.compact_fields, "is_open")
+        page = self.paginate_queryset(queryset)
+        rows = [self.compact_row(row) for row in (page if page is not None else queryset)]
+        if page is not None:
+            return self.get_paginated_response(rows)
+        return Response(rows)
+
+    @staticmethod
+    def compact_row(row):
+        return {
+            "id": row["id"],
+            "title": row["title"],
+            "thumbnail": row["thumbnail"],
+            "price": f"{row['price']:.2f}",
+            "closing_date": timezone.localtime(row["closing_date"]).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "current_bid": f"{row['current_bid']:.2f}" if row["current_bid"] is not None else None,
+            "comment_count": row["comment_count"],
+            "isOpen": row["is_open"],
+        }
+
     def get_permissions(self):
         if self.request.method == "GET":
             return [AllowAny()]
         return [IsRegisteredUserOrAdmin()]
+
+    def perform_create(self, serializer):
+        serializer.save()
+        touch_listing()
     
-class AuctionRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView): 
-    queryset = Auction.objects.all() 
+class AuctionImportView(APIView):
+    """
+    Importa el catálogo del usuario desde un fichero CSV o NDJSON (campo
+    `fichero`; el formato sale de `formato` o de la extensión). Devuelve cuántas
+    subastas se han creado y los errores de cada fila rechazada.
+    """
+    permission_classes = [IsRegisteredUserOrAdmin]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get("fichero")
+        if upload is None:
+            raise ValidationError({"fichero": "A CSV or NDJSON file is required."})
+        fmt = request.query_params.get("formato") or upload.name.rsplit(".", 1)[-1].lower()
+        if fmt not in FORMATS:
+            raise ValidationError({"formato": f"Formato must be one of: {', '.join(FORMATS)}."})
+        report = AuctionImport(request.user).run(read_rows(upload, fmt))
+        code = status.HTTP_201_CREATED if report["created"] else status.HTTP_400_BAD_REQUEST
+        return Response(report, status=code)
+
+class AuctionFacets(APIView):
+    """
+    Facetas para la barra de filtros: número de subastas por categoría, por
+    marca y por tramo de precio (de ancho `anchoPrecio`), con los mismos
+    filtros que el listado. Todo sale de una única consulta agrupada.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        width = request.query_params.get("anchoPrecio", "100")
+        if not width.isdigit() or int(width) <= 0:
+            raise ValidationError(
+                {"anchoPrecio": "AnchoPrecio must be a positive integer."},
+                code=status.HTTP_400_BAD_REQUEST
+            )
+        width = int(width)
+
+        # Solo cambian al crear, editar o borrar subastas
+        cache = get_cache()
+        version = get_versions([LISTING_VERSION_KEY])[LISTING_VERSION_KEY]
+        key = f"{request_cache_key('facets', request)}:{version}"
+        facets = cache.get(key)
+        if facets is None:
+            facets = self.compute_facets(request.query_params, width)
+            cache.set(key, facets, timeout=getattr(settings, "AUCTION_FACETS_TIMEOUT", 30))
+        return Response(facets)
+
+    def compute_facets(self, params, width):
+        queryset = filter_auctions(Auction.objects.all(), params, rank=False)
+        groups = queryset.order_by().annotate(bucket=Floor(F("price") / width)) \
+            .values("category_id", "brand", "bucket").annotate(count=Count("id"))
+
+        total = 0
+        categories, brands, buckets = {}, {}, {}
+        for group in groups:
+            total += group["count"]
+            categories[group["category_id"]] = categories.get(group["category_id"], 0) + group["count"]
+            brands[group["brand"]] = brands.get(group["brand"], 0) + group["count"]
+            bucket = int(group["bucket"])
+            buckets[bucket] = buckets.get(bucket, 0) + group["count"]
+
+        return {
+            "total": total,
+            "categories": [
+                {"id": pk, "name": category_registry.get_name(pk), "count": count}
+                for pk, count in sorted(categories.items())
+            ],
+            "brands": [
+                {"name": name, "count": count}
+                for name, count in sorted(brands.items(), key=lambda item: (-item[1], item[0]))
+            ],
+            "price_histogram": [
+                {"min": bucket * width, "max": (bucket + 1) * width, "count": count}
+                for bucket, count in sorted(buckets.items())
+            ],
+        }
+
+
+class AuctionRetrieveUpdateDestroy(CachedAuctionReadMixin, generics.RetrieveUpdateDestroyAPIView): 
     serializer_class = AuctionDetailSerializer
+    cache_listing = False
+
+    def get_queryset(self):
+        # La anotación depende de la hora, así que no puede ser un atributo de clase
+        return Auction.objects.with_is_open().select_related("result")
 
     def get_permissions(self):
         if self.request.method == "GET":
             return [AllowAny()]
         return [IsOwnerOrAdminAuction()]
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        auction = serializer.save()
+        if auction.is_closed and auction.closing_date > timezone.now():
+            services.reopen_auction(auction)
+        touch_auction(auction.id, listing=True)
+        broker.publish_on_commit(auction.id, "updated", {"closing_date": auction.closing_date})
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        touch_auction(instance.id, listing=True)
+        instance.delete()
+
 
 class BidListCreate(generics.ListCreateAPIView):
     permission_classes = [IsRegisteredUserOrAdmin]
     serializer_class = BidListCreateSerializer
+    pagination_class = KeysetPagination
+    keyset_orderings = {"-precio": ("-price", "-id")}
 
     def get_queryset(self):
         auction_id = self.kwargs["id_auctions"]
         return Bid.objects.filter(auction=auction_id).order_by('-price')
     
     def perform_create(self, serializer):
+        # La validación del serializador es orientativa; la decisión final la
+        # toma place_bid (o el secuenciador) de forma atómica contra la subasta de la URL
+        auction_id = self.kwargs["id_auctions"]
+        data = serializer.validated_data
+        serializer.instance = services.submit_bid(auction_id, data["price"], data["bidder"], self.request.user)
+
+class AuctionPriceHistory(APIView):
+    """
+    Histórico de precios de la subasta en tramos OHLC (?intervalo=segundos).
+    Se guarda en caché hasta que cambian las pujas de la subasta.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        interval = request.query_params.get("intervalo")
+        if interval is not None:
+            if not interval.isdigit() or int(interval) <= 0:
+                raise ValidationError(
+                    {"intervalo": "Intervalo must be a positive number of seconds."},
+                    code=status.HTTP_400_BAD_REQUEST
+                )
+            interval = int(interval)
+
         auction_id = self.kwargs["id_auctions"]
-        serializer.save(auction=Auction.objects.get(id=auction_id))
+        if not Auction.objects.filter(pk=auction_id).exists():
+            raise NotFound("The auction does not exist.")
+        version_key = auction_version_key(auction_id)
+        version = get_versions([version_key])[version_key]
+        key = f"subastas:auction:{auction_id}:history:{interval}:{version}"
+        cache = get_cache()
+        history = cache.get(key)
+        if history is None:
+            history = price_history(auction_id, interval)
+            cache.set(key, history, timeout=getattr(settings, "AUCTION_CACHE_TIMEOUT", 300))
+        return Response(history)
+
+class AuctionRatingSummary(APIView):
+    """Histograma de valoraciones de la subasta (1 a 5 estrellas), total y media."""
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        fields = ["rating_sum", "rating_count", "rating_1", "rating_2", "rating_3", "rating_4", "rating_5"]
+        auction = Auction.objects.filter(pk=self.kwargs["id_auctions"]).only(*fields).first()
+        if auction is None:
+            raise NotFound("The auction does not exist.")
+        return Response(RatingSummarySerializer(auction.rating_summary).data)
+
+class ProxyBidDetail(APIView):
+    """
+    Puja máxima del usuario en la subasta: PUT la crea o cambia, GET la
+    consulta y DELETE la retira. El servidor puja por él hasta ese máximo.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_auction(self):
+        try:
+            return Auction.objects.get(pk=self.kwargs["id_auctions"])
+        except Auction.DoesNotExist:
+            raise NotFound("The auction does not exist.")
+
+    def get_proxy(self):
+        try:
+            return ProxyBid.objects.get(auction=self.kwargs["id_auctions"], user=self.request.user)
+        except ProxyBid.DoesNotExist:
+            raise NotFound("You have no maximum bid on this auction.")
+
+    def get(self, request, *args, **kwargs):
+        return Response(ProxyBidSerializer(self.get_proxy()).data)
+
+    def put(self, request, *args, **kwargs):
+        auction = self.get_auction()
+        serializer = ProxyBidSerializer(data=request.data, context={"request": request, "auction": auction})
+        serializer.is_valid(raise_exception=True)
+        proxy, created = ProxyBid.objects.update_or_create(
+            auction=auction, user=request.user, defaults={"max_price": serializer.validated_data["max_price"]},
+        )
+        services.resolve_proxy_bids(auction.id)
+        return Response(ProxyBidSerializer(proxy).data,
+                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    def delete(self, request, *args, **kwargs):
+        self.get_proxy().delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 class BidRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsOwnerOrAdmin]
@@ -120,24 +385,148 @@ class BidRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
         auction_id = self.kwargs["id_auctions"]
         bid_id = self.kwargs["pk"]
         return Bid.objects.filter(auction=auction_id, id=bid_id)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        # La subasta se bloquea antes de escribir la puja, como en el secuenciador
+        services.lock_auctions([serializer.instance.auction_id])
+        bid = serializer.save()
+        services.refresh_bid_state(bid.auction_id)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        services.lock_auctions([instance.auction_id])
+        instance.delete()
+        services.refresh_bid_state(instance.auction_id)
     
 
+def with_method(request, method):
+    """Copia de la petición con otro método HTTP, para comprobar permisos de una suboperación."""
+    clone = copy.copy(request)
+    clone._request = copy.copy(request._request)
+    clone._request.method = method
+    return clone
+
+class AuctionBatch(APIView):
+    """
+    Varias operaciones en una sola petición:
+        {"atomico": true, "operaciones": [
+            {"op": "get", "id": 1},
+            {"op": "patch", "id": 2, "datos": {"price": "20.00"}},
+            {"op": "puja", "id": 3, "datos": {"price": "31.00", "bidder": "ana"}}]}
+    Cada operación pasa por los serializadores y permisos de su vista. Con
+    `atomico` todo se deshace si una falla (y las siguientes no se ejecutan);
+    sin él, cada operación va en su propia transacción. Las subastas de las
+    operaciones get y patch se leen con una única consulta id__in, y las
+    valoraciones del usuario de esas subastas con otra.
+    """
+    permission_classes = [AllowAny]
+    max_operations = 50
+    methods = {"get": "GET", "patch": "PATCH", "puja": "POST"}
+
+    def post(self, request, *args, **kwargs):
+        operations = self.validate_operations(request.data)
+        atomic = request.data.get("atomico", False) is True
+
+        ids = {op["id"] for op in operations if op["op"] != "puja"}
+        auctions = Auction.objects.with_is_open().select_related("result").in_bulk(ids)
+        user_ratings = {}
+        if request.user.is_authenticated and auctions:
+            user_ratings = dict(Rating.objects.filter(reviewer=request.user, auction_id__in=auctions)
+                                .values_list("auction_id", "rating"))
+
+        results = []
+        if atomic:
+            with transaction.atomic():
+                for op in operations:
+                    results.append(self.run(request, op, auctions, user_ratings))
+                    if results[-1]["status"] >= 400:
+                        transaction.set_rollback(True)
+                        break
+            failed = results[-1]["status"] if results[-1]["status"] >= 400 else None
+            results += [{"status": status.HTTP_424_FAILED_DEPENDENCY}] * (len(operations) - len(results))
+            return Response({"resultados": results}, status=failed or status.HTTP_200_OK)
+
+        for op in operations:
+            with transaction.atomic():
+                results.append(self.run(request, op, auctions, user_ratings))
+        return Response({"resultados": results})
+
+    def validate_operations(self, data):
+        operations = data.get("operaciones") if isinstance(data, dict) else None
+        if not isinstance(operations, list) or not 0 < len(operations) <= self.max_operations:
+            raise ValidationError({"operaciones": f"Operaciones must be a list of 1 to {self.max_operations} operations."})
+        for index, op in enumerate(operations):
+            if (not isinstance(op, dict) or op.get("op") not in self.methods
+                    or not isinstance(op.get("id"), int) or not isinstance(op.get("datos", {}), dict)):
+                raise ValidationError({"operaciones": f"Operation {index} must have an op (get, patch or puja), "
+                                                      f"an integer id and optional datos object."})
+        return operations
+
+    def run(self, request, op, auctions, user_ratings):
+        sub_request = with_method(request, self.methods[op["op"]])
+        try:
+            if op["op"] == "puja":
+                data, code = self.create_bid(sub_request, op), status.HTTP_201_CREATED
+            else:
+                data, code = self.auction_detail(sub_request, op, auctions, user_ratings), status.HTTP_200_OK
+        except APIException as exc:
+            return {"status": exc.status_code, "errors": exc.detail}
+        return {"status": code, "data": data}
+
+    def auction_detail(self, request, op, auctions, user_ratings):
+        view = AuctionRetrieveUpdateDestroy(request=request, args=(), kwargs={"pk": op["id"]}, format_kwarg=None)
+        auction = auctions.get(op["id"])
+        if auction is None:
+            raise NotFound("No Auction matches the given query.")
+        view.check_permissions(request)
+        view.check_object_permissions(request, auction)
+        context = {**view.get_serializer_context(), "user_ratings": user_ratings}
+        if op["op"] == "get":
+            return AuctionDetailSerializer(auction, context=context).data
+        serializer = AuctionDetailSerializer(auction, data=op.get("datos", {}), partial=True, context=context)
+        serializer.is_valid(raise_exception=True)
+        view.perform_update(serializer)
+        return serializer.data
+
+    def create_bid(self, request, op):
+        view = BidListCreate(request=request, args=(), kwargs={"id_auctions": op["id"]}, format_kwarg=None)
+        view.check_permissions(request)
+        serializer = BidListCreateSerializer(data={**op.get("datos", {}), "auction": op["id"]},
+                                             context=view.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        # place_bid directamente: el secuenciador guarda en su propia transacción
+        serializer.instance = services.place_bid(op["id"], data["price"], data["bidder"], request.user)
+        services.resolve_proxy_bids(op["id"])
+        return serializer.data
+
+
 class UserAuctionListView(APIView): 
     permission_classes = [IsAuthenticated] 
 
     def get(self, request, *args, **kwargs): 
         # Obtener las subastas del usuario autenticado 
-        user_auctions = Auction.objects.filter(auctioneer=request.user) 
+        user_auctions = filter_open(Auction.objects.with_is_open().filter(auctioneer=request.user), request.query_params)
         serializer = AuctionListCreateSerializer(user_auctions, many=True) 
         return Response(serializer.data) 
     
-class UserBidListView(APIView):
+class UserBidListView(generics.ListAPIView):
+    """
+    Resumen por subasta de las pujas del usuario (mi puja más alta, si voy
+    ganando y el estado de la subasta), en una única consulta agrupada.
+    """
     permission_classes = [IsAuthenticated]
+    serializer_class = UserBidSummarySerializer
+    pagination_class = KeysetPagination
+    keyset_orderings = {"reciente": ("-my_last_bid_at", "-auction_id"), "subasta": ("-auction_id",)}
 
-    def get(self, request, *args, **kwargs):
-        user_bids = Bid.objects.filter(bidder=request.user)
-        serializer = BidListCreateSerializer(user_bids, many=True)
-        return Response(serializer.data)
+    def get_queryset(self):
+        return Bid.objects.filter(user=self.request.user) \
+            .values("auction_id", "auction__title", "auction__thumbnail", "auction__closing_date",
+                    "auction__current_bid", "auction__bid_count") \
+            .annotate(my_highest_bid=Max("price"), my_bid_count=Count("id"), my_last_bid_at=Max("creation_date")) \
+            .order_by("-my_last_bid_at", "-auction_id")
     
 class UserCommentListView(APIView):
     permission_classes = [IsAuthenticated]
@@ -156,10 +545,24 @@ class RatingList(generics.ListCreateAPIView):
         return Rating.objects.filter(reviewer=self.request.user)
     
     def perform_create(self, serializer):
-        auction_id = self.request.data.get("auction")
-        if Rating.objects.filter(reviewer=self.request.user, auction=auction_id).exists():
-            raise ValidationError("Ya has calificado este producto.")
-        serializer.save(reviewer=self.request.user)
+        # Si ya la había valorado, se actualiza la valoración
+        data = serializer.validated_data
+        serializer.instance = services.upsert_ratings([(self.request.user.id, data["auction"].id, data["rating"])])[0]
+
+class RatingBulkUpsert(APIView):
+    """
+    Valora varias subastas de una vez: {"ratings": [{"auction": 1, "rating": 5}, ...]}.
+    Todas se escriben con una única sentencia (services.upsert_ratings).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = RatingBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        saved = services.upsert_ratings(
+            (request.user.id, item["auction"], item["rating"]) for item in serializer.validated_data["ratings"]
+        )
+        return Response({"ratings": len(saved)})
     
 class RatingRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
@@ -177,23 +580,49 @@ class RatingRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
         if self.request.method == "GET":
             return RatingRetrieveSerializer
         return RatingUpdateDestroySerializer
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old_value = serializer.instance.rating
+        rating = serializer.save()
+        services.rating_changed(rating.auction_id, old_value, rating.rating)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        services.rating_removed(instance.auction_id, instance.rating)
+        instance.delete()
     
 
-class CommentListView(generics.ListCreateAPIView):
+class CommentListView(generics.ListAPIView):
+    # Comentarios agrupados por subasta y, dentro de cada una, los más recientes primero
     serializer_class = CommentListCreateSerializer
     permission_classes = [AllowAny]
-    queryset = Comment.objects.all()
+    pagination_class = KeysetPagination
+    keyset_orderings = {"subasta": ("auction_id", "-creation_date", "-id")}
+
+    def get_queryset(self):
+        return Comment.objects.order_by("auction_id", "-creation_date", "-id")
 
 class CommentListCreateView(generics.ListCreateAPIView):
     serializer_class = CommentListCreateSerializer
+    pagination_class = KeysetPagination
+    keyset_orderings = {"reciente": ("-creation_date", "-id"), "id": ("id",)}
 
     def get_queryset(self):
         auction_id = self.kwargs['id_auctions']
-        return Comment.objects.filter(auction_id=auction_id)
+        return Comment.objects.filter(auction_id=auction_id).order_by("-creation_date", "-id")
 
+    @transaction.atomic
     def perform_create(self, serializer):
+        # La subasta sale de la URL, no de los datos: se comprueba aquí
         auction_id = self.kwargs['id_auctions']
+        state = get_auction_state(auction_id, self.request)
+        if state is None:
+            raise NotFound("The auction does not exist.")
+        if not state.is_open:
+            raise ValidationError({"auction": ["The auction has already closed. No more comments are allowed."]})
         serializer.save(author=self.request.user, auction_id=auction_id)
+        services.comment_added(auction_id)
 
     def get_permissions(self):
         if self.request.method == 'POST':
@@ -208,3 +637,12 @@ class CommentRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         if self.request.method == "GET":
             return [AllowAny()]
         return [IsOwnerOrAdmin()]
+
+    def perform_update(self, serializer):
+        comment = serializer.save()
+        touch_auction(comment.auction_id)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        services.comment_removed(instance.auction_id)
+        instance.delete()
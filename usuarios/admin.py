@@ -1,6 +1,28 @@
 from django.contrib import admin
+from django.db import transaction
 from .models import CustomUser
+from .authentication import invalidate_user
+from subastas.services import users_removed
 
 # Register your models here.
 
-admin.site.register(CustomUser)
\ No newline at end of file
+@admin.register(CustomUser)
+class CustomUserAdmin(admin.ModelAdmin):
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change:
+            invalidate_user(obj.pk)
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        invalidate_user(obj.pk)
+        users_removed([obj.pk])
+        super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        user_ids = list(queryset.values_list("pk", flat=True))
+        for pk in user_ids:
+            invalidate_user(pk)
+        users_removed(user_ids)
+        super().delete_queryset(request, queryset)
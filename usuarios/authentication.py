@@ -0,0 +1,153 @@
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+from django.db import router, transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .models import CustomUser
+
+# Autenticación JWT sin leer el usuario de la base de datos en cada petición.
+# Los access tokens llevan el nombre, is_staff, is_active y el sello de
+# autenticación del usuario, leídos de la base de datos al emitirlos (login,
+# registro y refresco; los refresh tokens no los llevan). El sello vive en la
+# caché compartida y se renueva cuando el perfil o la contraseña cambian;
+# mientras el del token coincida, el usuario se construye con los datos del
+# token. Si no coincide, el token no tiene esos datos o la caché no es
+# compartida por todos los procesos (LocMemCache), se usa una caché LRU del
+# proceso con TTL y, en último caso, la base de datos.
+
+CLAIM_FIELDS = ("username", "is_staff", "is_active")
+STAMP_CLAIM = "auth_stamp"
+STAMP_TIMEOUT = 60 * 60 * 24 * 2  # más que la vida del access token
+SHARED_BACKENDS = (RedisCache, BaseMemcachedCache, DatabaseCache)
+
+
+def get_cache():
+    return caches[getattr(settings, "AUTH_USER_CACHE_ALIAS", "default")]
+
+def claims_trusted():
+    """
+    Solo se confía en los datos del token si la caché del sello la comparten
+    todos los procesos; si no, invalidate_user no llegaría a los demás.
+    """
+    shared = getattr(settings, "AUTH_USER_CACHE_SHARED", None)
+    if shared is None:
+        shared = isinstance(get_cache(), SHARED_BACKENDS)
+    return shared
+
+def user_stamp_key(user_id):
+    return f"usuarios:user:{user_id}:stamp"
+
+
+def get_user_stamp(user_id):
+    """Sello de autenticación actual del usuario, creándolo si no existe."""
+    cache = get_cache()
+    key = user_stamp_key(user_id)
+    stamp = cache.get(key)
+    if stamp is None:
+        stamp = uuid.uuid4().hex
+        if not cache.add(key, stamp, timeout=STAMP_TIMEOUT):
+            stamp = cache.get(key, stamp)
+    return stamp
+
+
+def access_token_for(refresh, user):
+    """Access token de `refresh` con los datos actuales de `user` y su sello."""
+    access = refresh.access_token
+    for claim in CLAIM_FIELDS:
+        access[claim] = getattr(user, claim)
+    access[STAMP_CLAIM] = get_user_stamp(user.pk)
+    return access
+
+
+def invalidate_user(user_id):
+    """
+    Deja de confiar en los datos de los tokens ya emitidos para el usuario y lo
+    quita de la caché del proceso. Se aplica al confirmar la transacción.
+    """
+    def invalidate():
+        get_cache().set(user_stamp_key(user_id), uuid.uuid4().hex, timeout=STAMP_TIMEOUT)
+        _users.forget(user_id)
+    transaction.on_commit(invalidate)
+
+
+class UserCache:
+    """Caché LRU de usuarios del proceso; cada entrada recuerda el sello con el que se leyó."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, user_id, stamp):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires, entry_stamp, user = entry
+            if expires <= now or entry_stamp != stamp:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+        # Cada petición recibe su copia, por si la modifica
+        return copy.copy(user)
+
+    def set(self, user_id, stamp, user):
+        expires = time.monotonic() + getattr(settings, "AUTH_USER_CACHE_TTL", 60)
+        with self._lock:
+            self._entries[user_id] = (expires, stamp, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > getattr(settings, "AUTH_USER_CACHE_SIZE", 1024):
+                self._entries.popitem(last=False)
+
+    def forget(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_users = UserCache()
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication que confía en los datos firmados del token. El usuario
+    que devuelve con ellos solo tiene cargados id, username, is_staff e
+    is_active (como un .only()); el resto de campos se leen al acceder a ellos,
+    así que las vistas que necesitan el usuario completo deben cargarlo.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        stamp = get_cache().get(user_stamp_key(user_id))
+        if claims_trusted() and stamp is not None and validated_token.get(STAMP_CLAIM) == stamp \
+                and all(claim in validated_token for claim in CLAIM_FIELDS):
+            user = CustomUser.from_db(
+                router.db_for_read(CustomUser), ("id",) + CLAIM_FIELDS,
+                (user_id,) + tuple(validated_token[claim] for claim in CLAIM_FIELDS),
+            )
+        else:
+            user = _users.get(user_id, stamp)
+            if user is None:
+                user = super().get_user(validated_token)
+                _users.set(user_id, stamp, user)
+                return user
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
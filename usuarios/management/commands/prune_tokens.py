@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from usuarios.tokens import prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = ("Borra periódicamente los refresh tokens caducados y su entrada en la lista negra, "
+            "para que las tablas no crezcan más allá de REFRESH_TOKEN_LIFETIME.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true",
+                            help="Borra los tokens caducados y termina.")
+        parser.add_argument("--interval", type=float, default=3600,
+                            help="Segundos entre dos limpiezas.")
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Tokens borrados por transacción.")
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = prune_expired_tokens(batch_size=options["batch_size"])
+            if deleted:
+                self.stdout.write(f"Pruned {deleted} expired tokens.")
+            if options["once"]:
+                return
+            close_old_connections()
+            time.sleep(options["interval"])
@@ -1,5 +1,12 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from .models import CustomUser
+from .authentication import access_token_for
+from .tokens import RefreshToken
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -16,4 +23,48 @@ class UserSerializer(serializers.ModelSerializer):
 
 class ChangePasswordSerializer(serializers.Serializer): 
     old_password = serializers.CharField(required=True) 
-    new_password = serializers.CharField(required=True)
\ No newline at end of file
+    new_password = serializers.CharField(required=True)
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Añade al access token los datos que usa ClaimsJWTAuthentication."""
+    token_class = RefreshToken
+
+    def validate(self, attrs):
+        # La validación de TokenObtainSerializer (credenciales) sin la de
+        # TokenObtainPairSerializer, que emitiría el access token sin los datos
+        data = super(TokenObtainPairSerializer, self).validate(attrs)
+        refresh = self.get_token(self.user)
+        data["refresh"] = str(refresh)
+        data["access"] = str(access_token_for(refresh, self.user))
+        if api_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, self.user)
+        return data
+
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresco que consulta la lista negra a través del filtro de
+    usuarios/tokens.py y vuelve a leer el usuario para los datos del access
+    token, en lugar de copiarlos del refresh token.
+    """
+    token_class = RefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        try:
+            user = get_user_model().objects.get(
+                **{api_settings.USER_ID_FIELD: refresh.payload.get(api_settings.USER_ID_CLAIM)})
+        except get_user_model().DoesNotExist:
+            user = None
+        if not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+
+        data = {"access": str(access_token_for(refresh, user))}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data["refresh"] = str(refresh)
+        return data
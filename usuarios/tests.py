@@ -1,3 +1,160 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken as BaseRefreshToken
+from .authentication import STAMP_CLAIM, _users
+from .models import CustomUser
+from .tokens import blacklist_filter, prune_expired_tokens
 
 # Create your tests here.
+
+class ClaimsAuthenticationTests(TestCase):
+    """Autenticación con los datos del token (usuarios/authentication.py) y su invalidación."""
+
+    def setUp(self):
+        cache.clear()
+        _users.clear()
+        self.user = CustomUser.objects.create_user(username="ana", password="secreta", birth_date="1990-01-01",
+                                                   email="ana@example.com", is_staff=True)
+        self.admin = CustomUser.objects.create_superuser(username="admin", password="secreta",
+                                                         birth_date="1990-01-01", email="admin@example.com")
+
+    def login(self, username="ana", password="secreta"):
+        response = APIClient().post("/api/login/", {"username": username, "password": password}, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def client_for(self, access):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        return client
+
+    def user_queries(self, client, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(path)
+        return response, [q["sql"] for q in queries.captured_queries if "usuarios_customuser" in q["sql"]]
+
+    def admin_client(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        return client
+
+    @override_settings(AUTH_USER_CACHE_SHARED=True)
+    def test_claims_skip_user_query(self):
+        client = self.client_for(self.login()["access"])
+        response, queries = self.user_queries(client, "/api/subastas/mis-pujas/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_claims_ignored_without_shared_cache(self):
+        # Con LocMemCache cada proceso tiene su sello: no se puede confiar en el token
+        client = self.client_for(self.login()["access"])
+        response, queries = self.user_queries(client, "/api/subastas/mis-pujas/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        # La segunda petición sale de la caché LRU del proceso
+        response, queries = self.user_queries(client, "/api/subastas/mis-pujas/")
+        self.assertEqual(queries, [])
+
+    @override_settings(AUTH_USER_CACHE_SHARED=True)
+    def test_profile_change_renews_stamp(self):
+        client = self.client_for(self.login()["access"])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.patch("/api/usuarios/perfil/", {"username": "ana2"}, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        # El token dice "ana": ya no se confía en él y se lee el usuario
+        response, queries = self.user_queries(client, "/api/usuarios/perfil/")
+        self.assertEqual(response.data["username"], "ana2")
+        self.assertTrue(queries)
+
+    @override_settings(AUTH_USER_CACHE_SHARED=True)
+    def test_password_change_renews_stamp(self):
+        tokens = self.login()
+        client = self.client_for(tokens["access"])
+        stamp = AccessToken(tokens["access"])[STAMP_CLAIM]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post("/api/usuarios/cambiar-contrasena/",
+                                   {"old_password": "secreta", "new_password": "Otra-clave-larga-91"}, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertNotEqual(AccessToken(self.login(password="Otra-clave-larga-91")["access"])[STAMP_CLAIM], stamp)
+
+    @override_settings(AUTH_USER_CACHE_SHARED=True)
+    def test_demoted_staff_loses_rights(self):
+        tokens = self.login()
+        client = self.client_for(tokens["access"])
+        self.assertEqual(client.get("/api/usuarios/").status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.filter(pk=self.user.pk).update(is_staff=False)
+            response = self.admin_client().patch(f"/api/usuarios/{self.user.pk}/", {"locality": "Madrid"},
+                                                 format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(client.get("/api/usuarios/").status_code, 403)
+
+        # El refresco vuelve a leer el usuario en lugar de copiar los datos del refresh token
+        response = APIClient().post("/api/token/refresh/", {"refresh": tokens["refresh"]}, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertIs(AccessToken(response.data["access"])["is_staff"], False)
+        self.assertNotIn("is_staff", BaseRefreshToken(response.data["refresh"]).payload)
+        self.assertEqual(self.client_for(response.data["access"]).get("/api/usuarios/").status_code, 403)
+
+    @override_settings(AUTH_USER_CACHE_SHARED=True)
+    def test_deleted_user_is_rejected(self):
+        client = self.client_for(self.login()["access"])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.admin_client().delete(f"/api/usuarios/{self.user.pk}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(client.get("/api/subastas/mis-pujas/").status_code, 401)
+
+
+class RefreshTokenBlacklistTests(TestCase):
+    """Lista negra de refresh tokens con el filtro en memoria (usuarios/tokens.py)."""
+
+    def setUp(self):
+        blacklist_filter.clear()
+        CustomUser.objects.create_user(username="ana", password="secreta", birth_date="1990-01-01")
+        self.client = APIClient()
+        self.refresh = self.client.post("/api/login/", {"username": "ana", "password": "secreta"},
+                                        format="json").data["refresh"]
+
+    def rotate(self, refresh):
+        return self.client.post("/api/token/refresh/", {"refresh": refresh}, format="json")
+
+    def test_reused_refresh_token_is_rejected(self):
+        response = self.rotate(self.refresh)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertNotEqual(response.data["refresh"], self.refresh)
+        # El filtro ya lo conoce: se rechaza sin consultar la base de datos
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.rotate(self.refresh).status_code, 401)
+        self.assertEqual(queries.captured_queries, [])
+        self.assertEqual(self.rotate(response.data["refresh"]).status_code, 200)
+
+    def test_reuse_rejected_when_other_worker_rotated_it(self):
+        self.assertEqual(self.rotate(self.refresh).status_code, 200)
+        # Otro proceso: su filtro no conoce el token y no toca sincronizar; lo
+        # rechaza el INSERT en la lista negra
+        blacklist_filter.clear()
+        blacklist_filter._synced_at = time.monotonic()
+        self.assertEqual(self.rotate(self.refresh).status_code, 401)
+
+    def test_logged_out_token_is_rejected(self):
+        tokens = self.rotate(self.refresh).data
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(client.post("/api/usuarios/log-out/", {"refresh": tokens["refresh"]},
+                                     format="json").status_code, 205)
+        self.assertEqual(self.rotate(tokens["refresh"]).status_code, 401)
+
+    def test_prune_expired_tokens(self):
+        self.assertEqual(self.rotate(self.refresh).status_code, 200)
+        self.assertEqual(prune_expired_tokens(), 0)
+        later = timezone.now() + timedelta(days=8)
+        self.assertEqual(prune_expired_tokens(batch_size=1, now=later), 2)
+        self.assertFalse(OutstandingToken.objects.exists())
+        self.assertFalse(BlacklistedToken.objects.exists())
@@ -0,0 +1,116 @@
+import threading
+import time
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+from rest_framework_simplejwt.utils import aware_utcnow
+from .authentication import CLAIM_FIELDS, STAMP_CLAIM
+
+# Lista negra de refresh tokens con un filtro en memoria delante. Cada proceso
+# guarda los jti de la lista negra que no han caducado y los completa de forma
+# incremental (por id) como mucho cada TOKEN_BLACKLIST_SYNC_INTERVAL segundos,
+# así que la mayoría de refrescos no consultan la base de datos para saber si
+# el token está en la lista. La comprobación definitiva es al rotar: el token
+# usado entra en la lista con un INSERT que falla si ya estaba, de modo que un
+# refresh token no se puede reutilizar aunque el filtro de otro proceso aún no
+# lo conozca. Las filas caducadas se borran con el comando prune_tokens.
+
+
+class BlacklistFilter:
+    """jti de la lista negra conocidos por el proceso, con su caducidad."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._expires = {}
+        self._last_id = 0
+        self._synced_at = None
+
+    def contains(self, jti):
+        now = time.monotonic()
+        with self._lock:
+            stale = self._synced_at is None \
+                or now - self._synced_at >= getattr(settings, "TOKEN_BLACKLIST_SYNC_INTERVAL", 2)
+        if stale:
+            self.sync(now)
+        with self._lock:
+            return jti in self._expires
+
+    def sync(self, now=None):
+        with self._lock:
+            last_id = self._last_id
+        rows = list(BlacklistedToken.objects.filter(id__gt=last_id).order_by("id")
+                    .values_list("id", "token__jti", "token__expires_at"))
+        current = aware_utcnow()
+        with self._lock:
+            for _, jti, expires_at in rows:
+                self._expires[jti] = expires_at
+            if rows:
+                self._last_id = max(self._last_id, rows[-1][0])
+            # Lo caducado ya no puede usarse como token, no hace falta recordarlo
+            for jti in [jti for jti, expires_at in self._expires.items() if expires_at <= current]:
+                del self._expires[jti]
+            self._synced_at = time.monotonic() if now is None else now
+
+    def add(self, jti, expires_at):
+        with self._lock:
+            self._expires[jti] = expires_at
+
+    def clear(self):
+        with self._lock:
+            self._expires.clear()
+            self._last_id = 0
+            self._synced_at = None
+
+
+blacklist_filter = BlacklistFilter()
+
+
+class RefreshToken(BaseRefreshToken):
+    """RefreshToken que consulta la lista negra a través de blacklist_filter."""
+    # Los datos del usuario se ponen al emitir cada access token (access_token_for);
+    # los de un refresh token antiguo estarían sin comprobar
+    no_copy_claims = BaseRefreshToken.no_copy_claims + CLAIM_FIELDS + (STAMP_CLAIM,)
+
+    def check_blacklist(self):
+        if blacklist_filter.contains(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError("Token is blacklisted")
+
+    def blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        outstanding = OutstandingToken.objects.filter(jti=jti).only("id", "expires_at").first()
+        if outstanding is None:
+            # Token emitido sin pasar por for_user/outstand
+            blacklisted, created = super().blacklist()
+            outstanding = blacklisted.token
+        else:
+            try:
+                with transaction.atomic():
+                    blacklisted, created = BlacklistedToken.objects.create(token=outstanding), True
+            except IntegrityError:
+                blacklisted, created = None, False
+        blacklist_filter.add(jti, outstanding.expires_at)
+        if not created:
+            # Otra petición lo ha usado antes que esta
+            raise TokenError("Token is blacklisted")
+        return blacklisted, created
+
+
+def prune_expired_tokens(batch_size=1000, now=None):
+    """
+    Borra por lotes los refresh tokens caducados (y su entrada en la lista
+    negra, en cascada). Devuelve cuántos se han borrado.
+    """
+    now = now or aware_utcnow()
+    deleted = 0
+    while True:
+        ids = list(OutstandingToken.objects.filter(expires_at__lte=now)
+                   .order_by().values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
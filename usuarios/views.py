@@ -1,13 +1,16 @@
 from rest_framework import status, generics
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from .tokens import RefreshToken
 from .models import CustomUser
 from .serializers import UserSerializer, ChangePasswordSerializer
 from rest_framework.views import APIView
 from rest_framework.exceptions import ValidationError
 from django.contrib.auth.password_validation import validate_password
+from django.db import transaction
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from .permissions import IsUnregisteredUser
+from .authentication import access_token_for, invalidate_user
+from subastas.services import users_removed
 
 # Create your views here.
 class UserRegisterView(generics.CreateAPIView):
@@ -22,7 +25,7 @@ class UserRegisterView(generics.CreateAPIView):
             refresh = RefreshToken.for_user(user)
             return Response({
                 'user': serializer.data,
-                'access': str(refresh.access_token),
+                'access': str(access_token_for(refresh, user)),
                 'refresh': str(refresh),
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -39,6 +42,16 @@ class UserRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = UserSerializer
     queryset = CustomUser.objects.all()
 
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate_user(serializer.instance.pk)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        invalidate_user(instance.pk)
+        users_removed([instance.pk])
+        super().perform_destroy(instance)
+
 
 class LogoutView(APIView): 
     permission_classes = [IsAuthenticated] 
@@ -64,28 +77,33 @@ class LogoutView(APIView):
 
 class UserProfileView(APIView): 
     permission_classes = [IsAuthenticated] 
+    # request.user puede venir del token con solo algunos campos cargados
     def get(self, request): 
-        serializer = UserSerializer(request.user) 
+        serializer = UserSerializer(CustomUser.objects.get(pk=request.user.pk)) 
         return Response(serializer.data) 
  
     def patch(self, request): 
-        serializer = UserSerializer(request.user, data=request.data, partial=True) 
+        serializer = UserSerializer(CustomUser.objects.get(pk=request.user.pk), data=request.data, partial=True) 
         if serializer.is_valid(): 
             serializer.save() 
+            invalidate_user(request.user.pk)
             return Response(serializer.data) 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST) 
  
     def delete(self, request): 
         user = request.user 
-        user.delete() 
+        with transaction.atomic():
+            invalidate_user(user.pk)
+            users_removed([user.pk])
+            user.delete() 
         return Response(status=status.HTTP_204_NO_CONTENT)
     
 
 class ChangePasswordView(APIView): 
-    ermission_classes = [IsAuthenticated] 
+    permission_classes = [IsAuthenticated] 
     def post(self, request): 
         serializer = ChangePasswordSerializer(data=request.data) 
-        user = request.user 
+        user = CustomUser.objects.get(pk=request.user.pk) 
  
         if serializer.is_valid(): 
             if not user.check_password(serializer.validated_data['old_password']): 
@@ -99,6 +117,7 @@ class ChangePasswordView(APIView):
  
             user.set_password(serializer.validated_data['new_password']) 
             user.save() 
+            invalidate_user(user.pk)
             return Response({"detail": "Password updated successfully."}) 
  
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST) 